@@ -1,104 +1,83 @@
 from flask import Flask
-from config import Config
-from flask_sqlalchemy import SQLAlchemy
+from config import get_config
+from app.database import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from jinja2 import FileSystemBytecodeCache
+from app.cache import Cache
+from app.passwords import PasswordHasher
+from app import instrumentation
+from app.metrics import Metrics
+from app.assets import Assets
+from app.compression import Compression
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login = LoginManager(app)
-login.login_view = "login"
-
-# create all tables from models
-@app.before_first_request
-def create_tables():
-    from app.models import User, Log, Question, Attempt
-
-    db.create_all()
-    admin = User(
-        id="UWAadmin",
-        first_name="UWA",
-        surname="admin",
-        isAdmin=True,
-    )
-    admin.set_password("UWAadmin")
-    db.session.add(
-        Question(
-            question="Which component needs a fan or many fans to cool down?",
-            answer_type="MCQ",
-            answer_choice_1="M.2 Solid State Drive",
-            answer_choice_2="Random Access Memory",
-            answer_choice_3="Central Processing Unit",
-            answer_choice_4="I/O Shield",
-            answer="Central Processing Unit",
-        )
-    )
-    db.session.add(
-        Question(
-            question="Which of the following is the first step of assembling a PC?",
-            answer_type="MCQ",
-            answer_choice_1="Installing a CPU to a motherboard",
-            answer_choice_2="Installing a motherboard to a PC case",
-            answer_choice_3="Connecting power and SATA cables to various components",
-            answer_choice_4="Applying thermal paste onto the CPU",
-            answer="Installing a CPU to a motherboard",
-        )
-    )
-    db.session.add(
-        Question(
-            question="In figure 1, which slots should the RAMs be installed in?",
-            answer_type="MCQ",
-            answer_choice_1="8",
-            answer_choice_2="5",
-            answer_choice_3="7",
-            answer_choice_4="4",
-            answer="8",
-        )
-    )
-    db.session.add(
-        Question(
-            question="In figure 1, which slots should the GPUs be installed in?",
-            answer_type="MCQ",
-            answer_choice_1="6",
-            answer_choice_2="3",
-            answer_choice_3="7",
-            answer_choice_4="5",
-            answer="7",
-        )
-    )
-    db.session.add(
-        Question(
-            question="In figure 1, what is 3?",
-            answer_type="MCQ",
-            answer_choice_1="6-pin connectors",
-            answer_choice_2="HDMI",
-            answer_choice_3="Bluetooth",
-            answer_choice_4="SATA connectors",
-            answer="SATA connectors",
-        )
-    )
-    db.session.add(
-        Question(
-            question="Do you need to apply thermal paste if you are using stock cooler for your CPU?",
-            answer_type="MCQ",
-            answer_choice_1="Yes",
-            answer_choice_2="No",
-            answer_choice_3="I don't know",
-            answer_choice_4="I do not need a cooler for my CPU",
-            answer="No",
-        )
-    )
-    db.session.add(
-        Question(
-            question="A ___________ is a main printed circuit board that allows communications between different electronic components",
-            answer_type="SAQ",
-            answer="motherboard",
+db = SQLAlchemy()
+migrate = Migrate()
+login = LoginManager()
+login.login_view = "main.login"
+token_cache = Cache(config_prefix="TOKEN_CACHE")
+user_cache = Cache(config_prefix="USER_CACHE")
+password_hasher = PasswordHasher()
+metrics = Metrics()
+assets = Assets()
+compression = Compression()
+
+
+def create_app(config_class=None):
+    app = Flask(__name__)
+    app.config.from_object(config_class or get_config())
+
+    # compiled templates are kept on disk so new workers skip the jinja parse
+    if app.config["JINJA_BYTECODE_CACHE"]:
+        app.jinja_options = dict(
+            app.jinja_options,
+            bytecode_cache=FileSystemBytecodeCache(app.config["JINJA_BYTECODE_CACHE_DIR"]),
         )
+
+    db.init_app(app)
+    instrumentation.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True)
+    login.init_app(app)
+    token_cache.init_app(app)
+    user_cache.init_app(app)
+    password_hasher.init_app(app)
+
+    from app import models, rollups
+    from app.question_bank import question_bank
+
+    question_bank.init_app(app)
+
+    from app.log_buffer import log_buffer
+
+    log_buffer.init_app(app)
+
+    assets.init_app(app)
+
+    from app import conditional
+
+    conditional.init_app(app)
+
+    metrics.init_app(app)
+    metrics.track_cache("question_bank", question_bank)
+    metrics.track_cache("token", token_cache)
+    metrics.track_cache("user", user_cache)
+    metrics.track_cache("compression", compression.cache)
+
+    from app.routes import bp as main_bp
+
+    app.register_blueprint(main_bp)
+
+    from app.api import create_blueprint as create_api_blueprint
+
+    app.register_blueprint(
+        create_api_blueprint(lazy=app.config["LAZY_API"]), url_prefix="/api"
     )
-    db.session.add(admin)
-    db.session.commit()
 
+    from app import cli
+
+    cli.register(app)
+
+    # outermost, so it sees the finished response
+    compression.init_app(app)
 
-from app import routes, models
\ No newline at end of file
+    return app
@@ -1,2 +1,44 @@
-from app.api import student_api, project_api, token_api
-from app import app
+from flask import Blueprint
+from werkzeug.utils import cached_property, import_string
+
+# (rule, view, methods) for every API endpoint. The table lets the blueprint be
+# built without importing the view modules, which LAZY_API defers until a
+# request first reaches each view.
+ROUTES = [
+    ("/quiz/", "app.api.quiz_api.get_questions", ["GET"]),
+    ("/attempts/", "app.api.review_api.list_attempts", ["GET"]),
+    ("/tokens", "app.api.token_api.get_token", ["POST"]),
+    ("/tokens", "app.api.token_api.revoke_token", ["DELETE"]),
+    ("/questions", "app.api.question_api.export_questions", ["GET"]),
+    ("/questions", "app.api.question_api.import_questions", ["POST"]),
+    ("/questions/stats", "app.api.question_api.get_question_stats", ["GET"]),
+    ("/users", "app.api.user_api.register_user", ["POST"]),
+    ("/users/<id>", "app.api.user_api.get_user", ["GET"]),
+    ("/users/<id>/attempts", "app.api.user_api.new_user_attempt", ["POST"]),
+    ("/users/<id>/attempts", "app.api.user_api.get_user_attempts", ["GET"]),
+    ("/users/<id>/attempts/batch", "app.api.user_api.new_user_attempt_batch", ["POST"]),
+    ("/users/<id>/summary", "app.api.user_api.get_user_summary", ["GET"]),
+    ("/leaderboard", "app.api.leaderboard_api.get_leaderboard", ["GET"]),
+]
+
+
+class LazyView(object):
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit(".", 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def create_blueprint(lazy=False):
+    bp = Blueprint("api", __name__)
+    for rule, view, methods in ROUTES:
+        endpoint = view.rsplit(".", 1)[1]
+        view_func = LazyView(view) if lazy else import_string(view)
+        bp.add_url_rule(rule, endpoint, view_func, methods=methods)
+    return bp
@@ -0,0 +1,31 @@
+from app.api.errors import bad_request
+from flask import jsonify, url_for, request, current_app
+from app.api.auth import token_auth
+from app.leaderboard import decode_cursor, leaderboard_page
+
+
+@token_auth.login_required
+def get_leaderboard():
+    after = request.args.get("after")
+    try:
+        cursor = decode_cursor(after) if after else None
+    except ValueError:
+        return bad_request("Invalid cursor")
+    limit = min(
+        request.args.get("limit", current_app.config["API_PAGE_SIZE"], type=int),
+        current_app.config["API_MAX_PAGE_SIZE"],
+    )
+    if limit < 1:
+        return bad_request("limit must be positive")
+    ranked, next_cursor = leaderboard_page(cursor, limit)
+    data = {
+        "items": [dict(summary.to_dict(), rank=rank) for rank, summary in ranked],
+        "_meta": {"limit": limit, "count": len(ranked)},
+        "_links": {
+            "self": url_for("api.get_leaderboard", after=after, limit=limit),
+            "next": url_for("api.get_leaderboard", after=next_cursor, limit=limit)
+            if next_cursor is not None
+            else None,
+        },
+    }
+    return jsonify(data)
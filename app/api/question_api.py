@@ -0,0 +1,60 @@
+import io
+from app import db
+from app.api.errors import bad_request
+from app.api.auth import token_auth
+from app import question_io
+from app.question_stats import question_report
+from flask import (
+    jsonify,
+    request,
+    g,
+    abort,
+    current_app,
+    Response,
+    stream_with_context,
+)
+
+
+@token_auth.login_required
+def export_questions():
+    if not g.current_user.isAdmin:
+        abort(403)
+    fmt = request.args.get("format", "json")
+    if fmt not in question_io.FORMATS:
+        return bad_request(f"format must be one of {', '.join(question_io.FORMATS)}")
+    return Response(
+        stream_with_context(question_io.export_questions(fmt)),
+        mimetype=question_io.MIMETYPES[fmt],
+    )
+
+
+@token_auth.login_required
+def import_questions():
+    if not g.current_user.isAdmin:
+        abort(403)
+    fmt = request.args.get("format") or question_io.guess_format(request.mimetype)
+    if fmt not in question_io.FORMATS:
+        return bad_request("Send application/json, application/x-ndjson or text/csv")
+    # parse straight off the request body instead of buffering it
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        created, updated, unchanged = question_io.import_questions(
+            question_io.read_questions(stream, fmt)
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return bad_request(f"{e}. Nothing was imported.")
+    db.session.commit()
+    return jsonify({"created": created, "updated": updated, "unchanged": unchanged})
+
+
+@token_auth.login_required
+def get_question_stats():
+    if not g.current_user.isAdmin:
+        abort(403)
+    days = request.args.get("days", current_app.config["QUESTION_TREND_DAYS"], type=int)
+    if not 1 <= days <= current_app.config["QUESTION_TREND_MAX_DAYS"]:
+        return bad_request(
+            f"days must be from 1 to {current_app.config['QUESTION_TREND_MAX_DAYS']}"
+        )
+    return jsonify({"items": question_report(days), "_meta": {"days": days}})
@@ -1,18 +1,16 @@
-from app import app, db
+from app import db
 from app.models import User, Log, Question, Attempt
 from app.api.errors import bad_request, error_response
-from flask import jsonify, url_for, request, g, abort
+from flask import jsonify, url_for, request, g, abort, current_app
 from app.api.auth import token_auth
+from app.question_bank import question_bank
+from app.conditional import conditional
 
 
-@app.route("/api/quiz/", methods=["GET"])
 @token_auth.login_required
+@conditional(lambda: (question_bank.get().version,), vary="Authorization")
 def get_questions():
-    questions = Question.query.all()
-    if questions is None:
+    bank = question_bank.get()
+    if not bank:
         return error_response(404, "There are no questions")
-    data = {}
-    for question in questions:
-        question_dict = question.to_dict()
-        data[f"{question.question_id}"] = question_dict
-    return jsonify(data)
\ No newline at end of file
+    return current_app.response_class(bank.json, mimetype="application/json")
@@ -1,17 +1,69 @@
-from app import app, db
+from app import db
 from app.models import User, Log, Question, Attempt
 from app.api.errors import bad_request, error_response
-from flask import jsonify, url_for, request
+from app.api.auth import token_auth
+from app.pagination import id_page
+from flask import (
+    jsonify,
+    url_for,
+    request,
+    g,
+    abort,
+    json,
+    current_app,
+    Response,
+    stream_with_context,
+)
+from sqlalchemy.orm import selectinload
 
 
-@app.route("/api/attempts/", methods=["GET"])
+def wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def stream_attempts(query):
+    # yield_per reads the rows through a server-side cursor in fixed-size
+    # batches, so exporting the whole table uses constant memory
+    def generate():
+        for attempt in query.order_by(Attempt.attempt_id).yield_per(
+            current_app.config["API_STREAM_BATCH_SIZE"]
+        ):
+            yield json.dumps(attempt.to_dict()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def attempts_response(query, endpoint, **kwargs):
+    """Serve a page of attempts (?after=&limit=) or, on request, all of them as NDJSON."""
+    query = query.options(selectinload(Attempt.answers))
+    if wants_ndjson():
+        return stream_attempts(query)
+    after = request.args.get("after", type=int)
+    limit = min(
+        request.args.get("limit", current_app.config["API_PAGE_SIZE"], type=int),
+        current_app.config["API_MAX_PAGE_SIZE"],
+    )
+    if limit < 1:
+        return bad_request("limit must be positive")
+    attempts, next_after = id_page(query, Attempt.attempt_id, after, limit)
+    data = {
+        "items": [attempt.to_dict() for attempt in attempts],
+        "_meta": {"limit": limit, "count": len(attempts)},
+        "_links": {
+            "self": url_for(endpoint, after=after, limit=limit, **kwargs),
+            "next": url_for(endpoint, after=next_after, limit=limit, **kwargs)
+            if next_after is not None
+            else None,
+        },
+    }
+    return jsonify(data)
+
+
+@token_auth.login_required
 def list_attempts():
-    print("getting results")
-    attempts = Attempt.query.all()
-    if attempts is None:
-        return error_response(404, "No one has attempted the quiz yet. :(")
-    data = {}
-    for attempt in attempts:
-        attempt_dict = attempt.to_dict()
-        data[f"{attempt.attempt_id}"] = attempt_dict
-    return jsonify(data)
\ No newline at end of file
+    if not g.current_user.isAdmin:
+        abort(403)
+    return attempts_response(Attempt.query, "api.list_attempts")
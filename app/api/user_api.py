@@ -1,20 +1,33 @@
-from app import app, db
-from app.models import User, Log, Question, Attempt
+from app import db
+from app.models import User, Log, Question, Attempt, UserSummary
 from app.api.errors import bad_request, error_response
-from flask import jsonify, url_for, request, g, abort
+from flask import jsonify, url_for, request, g, abort, json, current_app
 from app.api.auth import token_auth
+from app.controllers import AttemptController
+from app.question_bank import question_bank
+from app.api.review_api import attempts_response
+from app.conditional import conditional, attempts_stamp
+from app.leaderboard import user_rank
+from datetime import datetime
 
 
-@app.route("/api/users/<id>", methods=["GET"])
 @token_auth.login_required
 def get_user(id):
-    print(g.current_user)
     if g.current_user.id != id:
         abort(403)
     return jsonify(User.query.get_or_404(id).to_dict())
 
 
-@app.route("/api/users", methods=["POST"])
+@token_auth.login_required
+def get_user_summary(id):
+    if g.current_user.id != id:
+        abort(403)
+    rank, summary = user_rank(id)
+    if summary is None:
+        summary = UserSummary(user_id=id, attempts=0)  # no attempts yet
+    return jsonify(dict(summary.to_dict(), rank=rank))
+
+
 def register_user():
     data = request.get_json() or {}
     if "id" not in data or "password_hash" not in data:
@@ -28,52 +41,133 @@ def register_user():
     db.session.commit()
     response = jsonify(user.to_dict())
     response.status_code = 201  # creating a new resource should chare the location....
-    response.headers["Location"] = url_for("get_user", id=user.id)
+    response.headers["Location"] = url_for("api.get_user", id=user.id)
     return response
 
 
-@app.route("/api/users/<id>/attempts", methods=["POST"])
+def attempt_from_dict(data, bank):
+    """Build an unsaved attempt, raising ValueError when ``data`` is not a valid one."""
+    attempt = Attempt()
+    # ids and owners are assigned by the server, and the date is parsed below
+    date = data.get("date")
+    data = {k: v for k, v in data.items() if k not in ("attempt_id", "user_id", "date")}
+    try:
+        attempt.from_dict(data)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError("answers must map question ids to answers")
+    if date is not None:
+        try:
+            attempt.from_dict({"date": date})
+        except (TypeError, ValueError):
+            raise ValueError("date must be an ISO 8601 string")
+        if not isinstance(attempt.date, datetime):
+            raise ValueError("date must be an ISO 8601 string")
+    if any(not isinstance(a.answer, (str, type(None))) for a in attempt.answers):
+        raise ValueError("answers must be strings")
+    question_ids = [answer.question_id for answer in attempt.answers]
+    repeated = sorted({qid for qid in question_ids if question_ids.count(qid) > 1})
+    if repeated:
+        raise ValueError(f"Question ids answered more than once: {repeated}")
+    unknown = [
+        answer.question_id
+        for answer in attempt.answers
+        if answer.question_id not in bank.answer_key
+    ]
+    if unknown:
+        raise ValueError(f"Unknown question ids: {unknown}")
+    return attempt
+
+
+def batch_items():
+    """The attempts in a JSON array or NDJSON body; unparseable lines become None."""
+    if request.mimetype == "application/x-ndjson":
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError("Body must be a JSON array or NDJSON of attempts")
+    return items
+
+
 @token_auth.login_required
 def new_user_attempt(id):
     if g.current_user.id != id:
         abort(403)
     data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return bad_request("Attempt must be a JSON object")
     # if "marks" not in data or "result_id" not in data:
     #     return bad_request("Must include marks and result_id")
-    user = User.query.get(id)
-    if user is None:
-        return bad_request("Unknown user, or wrong id")
-    attempt = Attempt()
-    attempt.from_dict(data)
-    questions = Question.query.all()
-    attempt.correct_1 = questions[0].answer == attempt.answer_1
-    attempt.correct_2 = questions[1].answer == attempt.answer_2
-    attempt.correct_3 = questions[2].answer == attempt.answer_3
-    attempt.correct_4 = questions[3].answer == attempt.answer_4
-    attempt.correct_5 = questions[4].answer == attempt.answer_5
-    attempt.correct_6 = questions[5].answer == attempt.answer_6
-    attempt.correct_7 = questions[6].answer == attempt.answer_7
-    db.session.flush()
-    db.session.commit()
+    user = g.current_user
+    try:
+        attempt = attempt_from_dict(data, question_bank.get())
+    except ValueError as e:
+        return bad_request(str(e))
+    attempt.user_id = user.id
+    AttemptController.submit(attempt)
     response = jsonify(attempt.to_dict())
     response.status_code = 201  # creating a new resource should chare the location....
-    response.headers["Location"] = url_for("new_user_attempt", id=user.id)
+    response.headers["Location"] = url_for("api.new_user_attempt", id=user.id)
     return response
 
 
-@app.route("/api/users/<id>/attempts", methods=["GET"])
+def own_attempts_stamp(id):
+    # other users' requests fall through to the view, which refuses them
+    if g.current_user.id != id:
+        return None
+    return attempts_stamp(id)
+
+
 @token_auth.login_required
+@conditional(own_attempts_stamp, vary="Authorization")
 def get_user_attempts(id):
     if g.current_user.id != id:
         abort(403)
-    user = User.query.get(id)
-    attempts = Attempt.query.filter_by(user_id=id)
-    if user is None:
-        return error_response(404, "User not found.")
-    if attempts is None:
-        return error_response(404, "User has not done any assessments.")
-    data = {}
-    for attempt in attempts:
-        attempt_dict = attempt.to_dict()
-        data[f"{attempt.attempt_id}"] = attempt_dict
-    return jsonify(data)
+    return attempts_response(
+        Attempt.query.filter_by(user_id=id), "api.get_user_attempts", id=id
+    )
+
+
+@token_auth.login_required
+def new_user_attempt_batch(id):
+    if g.current_user.id != id:
+        abort(403)
+    try:
+        items = batch_items()
+    except ValueError as e:
+        return bad_request(str(e))
+    limit = current_app.config["API_BATCH_MAX_SIZE"]
+    if len(items) > limit:
+        return bad_request(f"At most {limit} attempts per batch")
+    bank = question_bank.get()
+    results, attempts = [], []
+    for index, data in enumerate(items):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Each attempt must be a JSON object")
+            attempt = attempt_from_dict(data, bank)
+        except ValueError as e:
+            results.append({"index": index, "status": 400, "error": str(e)})
+            continue
+        attempt.user_id = g.current_user.id
+        attempts.append(attempt)
+        results.append({"index": index, "status": 201, "attempt": attempt})
+    AttemptController.submit_many(attempts)
+    # read the new rows back before the commit expires them
+    for result in results:
+        if "attempt" in result:
+            result["attempt"] = result["attempt"].to_dict()
+    db.session.commit()
+    return jsonify(
+        {
+            "items": results,
+            "_meta": {"created": len(attempts), "rejected": len(items) - len(attempts)},
+        }
+    )
@@ -0,0 +1,227 @@
+"""Fingerprinted, precompressed static files served with immutable caching.
+
+``flask assets build`` copies every file in app/static into ASSETS_DIR under a
+name carrying a hash of its content (pc-wiki.css -> pc-wiki.1a2b3c4d5e6f.css).
+Text files get a .gz copy next to them, plus a .br copy when the brotli package
+is installed. With Pillow installed, the photos also get downscaled JPEG and
+WebP copies at ASSETS_IMAGE_WIDTHS. All of the names are recorded in
+manifest.json.
+
+Once a manifest exists, ``url_for("static", ...)`` returns the fingerprinted
+name. The static view then serves it with a year-long immutable Cache-Control,
+picking the .br or .gz copy the client accepts. A changed file gets a new URL,
+so browsers never have to revalidate. Without a build, static files are served
+as before.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory, url_for
+
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".svg", ".ico", ".json", ".txt", ".html")
+PHOTOS = (".jpg", ".jpeg")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))  # in order of preference
+ONE_YEAR = 365 * 24 * 60 * 60
+IMMUTABLE = f"public, max-age={ONE_YEAR}, immutable"
+
+
+def empty_manifest():
+    return {"files": {}, "encodings": {}, "images": {}}
+
+
+def fingerprint(name, data, suffix=""):
+    """``name`` with a hash of ``data`` before the extension."""
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"{stem}{suffix}.{digest}{ext}"
+
+
+def compressors():
+    """(encoding, file suffix, compress) for every encoding available here."""
+    available = []
+    for encoding, suffix in ENCODINGS:
+        if encoding == "br":
+            try:
+                import brotli
+            except ImportError:
+                continue
+            available.append((encoding, suffix, lambda data: brotli.compress(data)))
+        else:
+            available.append(
+                (encoding, suffix, lambda data: gzip.compress(data, 9, mtime=0))
+            )
+    return available
+
+
+def resized_copies(data, widths, quality):
+    """Yield (width, mimetype, extension, bytes) copies of a photo.
+
+    Widths at or above the photo's own are skipped, and WebP is also made at
+    full size. Yields nothing when Pillow is not installed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    with Image.open(io.BytesIO(data)) as original:
+        image = original.convert("RGB")
+    sizes = sorted(width for width in widths if width < image.width)
+    for width in sizes + [image.width]:
+        if width == image.width:
+            copy = image
+        else:
+            height = round(image.height * width / image.width)
+            copy = image.resize((width, height), Image.LANCZOS)
+        formats = [("image/webp", ".webp", "WEBP", {"method": 6})]
+        if width != image.width:
+            formats.append(
+                ("image/jpeg", ".jpg", "JPEG", {"optimize": True, "progressive": True})
+            )
+        for mimetype, ext, fmt, options in formats:
+            buffer = io.BytesIO()
+            copy.save(buffer, fmt, quality=quality, **options)
+            yield width, mimetype, ext, buffer.getvalue()
+
+
+class Assets(object):
+    def __init__(self, app=None):
+        self.directory = None
+        self.manifest = empty_manifest()
+        self.version = None
+        self.built = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config["ASSETS_DIR"]
+        self.load()
+        # mixed into the derived ETag salt, since pages embed the asset urls
+        app.config["ASSETS_VERSION"] = self.version
+        app.url_defaults(self._fingerprint_url)
+        app.view_functions["static"] = self.send_static
+        app.add_template_global(self.srcset)
+
+    def load(self, directory=None):
+        """Read the manifest written by ``build``; a missing one means no build."""
+        self.directory = directory or self.directory
+        self.manifest, self.version = empty_manifest(), None
+        path = os.path.join(self.directory or "", MANIFEST)
+        if not self.directory or not os.path.exists(path):
+            self.built = set()
+            return
+        with open(path, "rb") as file:
+            data = file.read()
+        self.manifest = json.loads(data)
+        self.version = hashlib.sha256(data).hexdigest()[:12]
+        self.built = set(self.manifest["files"].values())
+        for sources in self.manifest["images"].values():
+            for copies in sources.values():
+                self.built.update(name for name, _ in copies)
+
+    def build(self, source, directory, widths=(), quality=80):
+        """Write the fingerprinted and compressed copies of ``source`` to ``directory``.
+
+        Earlier builds are left in place, so pages cached before a deploy can
+        still load their assets. Returns the manifest.
+        """
+        manifest = empty_manifest()
+        available = compressors()
+        directory = os.path.abspath(directory)
+
+        def write(name, data):
+            path = os.path.join(directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(data)
+
+        for root, _, files in os.walk(source):
+            if os.path.join(os.path.abspath(root), "").startswith(
+                os.path.join(directory, "")
+            ):
+                continue  # the output lives inside the source folder
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                name = os.path.relpath(path, source).replace(os.sep, "/")
+                ext = os.path.splitext(name)[1].lower()
+                with open(path, "rb") as f:
+                    data = f.read()
+                built = fingerprint(name, data)
+                write(built, data)
+                manifest["files"][name] = built
+                if ext in COMPRESSIBLE:
+                    encodings = []
+                    for encoding, suffix, compress in available:
+                        compressed = compress(data)
+                        if len(compressed) < len(data):
+                            write(built + suffix, compressed)
+                            encodings.append(encoding)
+                    if encodings:
+                        manifest["encodings"][built] = encodings
+                if ext in PHOTOS:
+                    sources = {}
+                    for width, mimetype, suffix, copy in resized_copies(
+                        data, widths, quality
+                    ):
+                        stem = os.path.splitext(name)[0]
+                        copy_name = fingerprint(stem + suffix, copy, f"-{width}w")
+                        write(copy_name, copy)
+                        sources.setdefault(mimetype, []).append([copy_name, width])
+                    if sources:
+                        manifest["images"][name] = sources
+
+        # write then rename so a worker starting up never reads half a manifest
+        path = os.path.join(directory, MANIFEST)
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+        return manifest
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == "static":
+            built = self.manifest["files"].get(values.get("filename"))
+            if built is not None:
+                values["filename"] = built
+
+    def send_static(self, filename):
+        if filename not in self.built:
+            return current_app.send_static_file(filename)
+        encodings = self.manifest["encodings"].get(filename, ())
+        accepted = [
+            (request.accept_encodings[encoding], encoding)
+            for encoding in encodings
+            if request.accept_encodings[encoding]
+        ]
+        # max keeps the first of equal qualities, and encodings are in preference order
+        encoding = max(accepted, key=lambda item: item[0])[1] if accepted else None
+        suffix = dict(ENCODINGS).get(encoding, "")
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(
+            self.directory, filename + suffix, mimetype=mimetype, cache_timeout=ONE_YEAR
+        )
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        if encodings:
+            response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    def srcset(self, filename, mimetype="image/jpeg"):
+        """The srcset of the built copies of an image; empty without a build."""
+        images = self.manifest["images"].get(filename)
+        if not images:
+            return ""
+        copies = list(images.get(mimetype, ()))
+        if mimetype == "image/jpeg":
+            # the full size jpeg is the fingerprinted original, as wide as the
+            # full size webp
+            width = max(width for sources in images.values() for _, width in sources)
+            copies.append([self.manifest["files"][filename], width])
+        return ", ".join(
+            f"{url_for('static', filename=name)} {width}w" for name, width in copies
+        )
@@ -0,0 +1,118 @@
+"""Key/value caches with a pluggable backend.
+
+Each cache reads ``<PREFIX>_URL``, ``<PREFIX>_SIZE`` and ``<PREFIX>_TTL`` from the
+app config. ``memory://`` keeps a bounded LRU with per-entry expiry inside the
+worker; it is the default and the stand-in used by the tests. ``redis://`` shares
+the entries between gunicorn workers and needs the optional redis package.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend(object):
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend(object):
+    def __init__(self, url, ttl=300, namespace=""):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("redis:// caches need the redis package installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def get(self, key):
+        value = self.client.get(self.namespace + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.namespace + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.namespace + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.namespace + "*"):
+            self.client.delete(key)
+
+
+class Cache(object):
+    def __init__(self, app=None, config_prefix="CACHE"):
+        self.config_prefix = config_prefix
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = self.config_prefix
+        url = app.config.get(f"{prefix}_URL") or "memory://"
+        ttl = app.config.get(f"{prefix}_TTL", 300)
+        if url.startswith("memory://"):
+            self.backend = MemoryBackend(app.config.get(f"{prefix}_SIZE", 1024), ttl)
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            self.backend = RedisBackend(url, ttl, namespace=f"{prefix.lower()}:")
+        else:
+            raise ValueError(f"Unsupported {prefix}_URL: {url}")
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,99 @@
+import click
+from app import db
+from app.rollups import (
+    rebuild_daily_stats,
+    rebuild_question_stats,
+    rebuild_user_summaries,
+)
+from app.seed import seed as seed_database
+from app import assets as static_assets, question_io
+
+
+def register(app):
+    @app.cli.command()
+    def seed():
+        """Create the admin user and upsert the question bank (idempotent)."""
+        admin_created, (created, updated, unchanged) = seed_database()
+        if admin_created:
+            click.echo("Created admin user.")
+        click.echo(
+            f"Questions: {created} created, {updated} updated, {unchanged} unchanged."
+        )
+
+    @app.cli.group()
+    def stats():
+        """Visitor and attempt statistics commands."""
+        pass
+
+    @stats.command()
+    def backfill():
+        """Rebuild the daily, user and question counters from the logs and attempts."""
+        days = rebuild_daily_stats()
+        click.echo(f"Backfilled statistics for {days} day(s).")
+        users = rebuild_user_summaries()
+        click.echo(f"Backfilled summaries for {users} user(s).")
+        questions = rebuild_question_stats()
+        click.echo(f"Backfilled answer counts for {questions} question(s).")
+
+    @app.cli.group()
+    def questions():
+        """Question bank import and export commands."""
+        pass
+
+    @questions.command("import")
+    @click.argument("file", type=click.File("r", encoding="utf-8"))
+    @click.option("--format", "fmt", type=click.Choice(question_io.FORMATS))
+    @click.option("--batch-size", type=int, help="Questions upserted per flush.")
+    def import_(file, fmt, batch_size):
+        """Upsert questions by key from a JSON, NDJSON or CSV file (- for stdin)."""
+        fmt = fmt or question_io.guess_format(file.name)
+        if fmt is None:
+            raise click.UsageError("Cannot tell the format from the name; use --format.")
+        try:
+            created, updated, unchanged = question_io.import_questions(
+                question_io.read_questions(file, fmt), batch_size
+            )
+        except ValueError as e:
+            db.session.rollback()
+            raise click.ClickException(f"{e}. Nothing was imported.")
+        db.session.commit()
+        click.echo(
+            f"Questions: {created} created, {updated} updated, {unchanged} unchanged."
+        )
+
+    @questions.command()
+    @click.argument("file", type=click.File("w", encoding="utf-8"), default="-")
+    @click.option("--format", "fmt", type=click.Choice(question_io.FORMATS))
+    def export(file, fmt):
+        """Write the question bank as JSON, NDJSON or CSV (default: stdout as JSON)."""
+        fmt = fmt or question_io.guess_format(file.name) or "json"
+        for chunk in question_io.export_questions(fmt):
+            file.write(chunk)
+
+    @app.cli.group()
+    def assets():
+        """Static asset commands."""
+        pass
+
+    @assets.command()
+    @click.option("--output", help="Directory to write to (default: ASSETS_DIR).")
+    def build(output):
+        """Fingerprint, precompress and resize the static files."""
+        output = output or app.config["ASSETS_DIR"]
+        manifest = static_assets.build(
+            app.static_folder,
+            output,
+            app.config["ASSETS_IMAGE_WIDTHS"],
+            app.config["ASSETS_IMAGE_QUALITY"],
+        )
+        copies = sum(
+            len(sources)
+            for images in manifest["images"].values()
+            for sources in images.values()
+        )
+        click.echo(
+            f"Built {len(manifest['files'])} file(s), {len(manifest['encodings'])} "
+            f"precompressed and {copies} image copies, in {output}."
+        )
+        if not copies:
+            click.echo("Install Pillow to also build responsive and WebP images.")
@@ -0,0 +1,200 @@
+"""Compress HTML, JSON and other text responses on the way out.
+
+``Compression`` wraps each app's WSGI app in a ``CompressionMiddleware`` that
+gzip or brotli encodes a response when all of these hold:
+
+- the client accepts the encoding;
+- the response's mimetype is in COMPRESS_MIMETYPES;
+- the response has no Content-Encoding yet, so built assets pass through;
+- the body is at least COMPRESS_MIN_SIZE bytes.
+
+A streamed response has no Content-Length. It is compressed as it goes and
+flushed every COMPRESS_STREAM_FLUSH_SIZE bytes, so the first rows still reach
+the client early.
+
+A response with an ETag has the same body every time it carries that ETag. Its
+compressed bytes are cached under the ETag, so a repeat only copies them.
+Compressing makes a strong ETag weak, since the bytes on the wire change.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+from app.cache import Cache
+
+
+class GzipEncoder(object):
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder(object):
+    def __init__(self, brotli, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def available_encoders(level, brotli_quality):
+    """Encoder factories by content coding, in order of preference."""
+    encoders = {}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders["br"] = lambda: BrotliEncoder(brotli, brotli_quality)
+    encoders["gzip"] = lambda: GzipEncoder(level)
+    return encoders
+
+
+def close(app_iter):
+    if hasattr(app_iter, "close"):
+        app_iter.close()
+
+
+class Compression(object):
+    """Wraps each app in its own ``CompressionMiddleware``; only the cache is shared."""
+
+    def __init__(self, app=None):
+        self.cache = Cache(config_prefix="COMPRESS_CACHE")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.init_app(app)
+        if app.config["COMPRESS_ENABLED"]:
+            app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config, self.cache)
+
+
+class CompressionMiddleware(object):
+    def __init__(self, wsgi_app, config, cache):
+        self.wsgi_app = wsgi_app
+        self.cache = cache
+        self.min_size = config["COMPRESS_MIN_SIZE"]
+        self.level = config["COMPRESS_LEVEL"]
+        self.mimetypes = set(config["COMPRESS_MIMETYPES"])
+        self.flush_size = config["COMPRESS_STREAM_FLUSH_SIZE"]
+        self.encoders = available_encoders(self.level, config["COMPRESS_BROTLI_QUALITY"])
+
+    def negotiate(self, header):
+        """The preferred encoding the client accepts, or None."""
+        accept = parse_accept_header(header)
+        best, best_quality = None, 0
+        for encoding in self.encoders:
+            quality = accept[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compressible(self, status, headers):
+        mimetype = headers.get("Content-Type", "").split(";")[0].strip().lower()
+        return (
+            status.startswith("200")
+            and "Content-Encoding" not in headers
+            and mimetype in self.mimetypes
+            and "no-transform" not in headers.get("Cache-Control", "")
+        )
+
+    def __call__(self, environ, start_response):
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return self.wsgi_app(environ, start_response)
+
+        # flask calls start_response before returning the body; hold the call
+        # back so the headers can still be rewritten
+        captured = []
+
+        def deferred(status, headers, exc_info=None):
+            captured[:] = [status, Headers(headers), exc_info]
+            return lambda data: None  # flask never uses write()
+
+        app_iter = self.wsgi_app(environ, deferred)
+        status, headers, exc_info = captured
+        if not self.compressible(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        # caches must keep the encodings apart even when this one is identity
+        vary = headers.get("Vary")
+        if not vary:
+            headers["Vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower():
+            headers["Vary"] = f"{vary}, Accept-Encoding"
+
+        encoding = self.negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        length = headers.get("Content-Length")
+        if encoding is None or (length is not None and int(length) < self.min_size):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        if length is None:
+            self.encoded_headers(headers, encoding)
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return self.stream(app_iter, encoding)
+
+        etag = headers.get("ETag")
+        key = None
+        if etag:
+            path = environ.get("PATH_INFO", "") + "?" + environ.get("QUERY_STRING", "")
+            key = f"{encoding}:{self.level}:{path}:{etag}"
+        body = self.cache.get(key) if key else None
+        if body is None:
+            try:
+                data = b"".join(app_iter)
+            finally:
+                close(app_iter)
+            encoder = self.encoders[encoding]()
+            body = encoder.compress(data) + encoder.finish()
+            if len(body) >= len(data):
+                start_response(status, headers.to_wsgi_list(), exc_info)
+                return [data]
+            if key:
+                self.cache.set(key, body)
+        else:
+            close(app_iter)
+        self.encoded_headers(headers, encoding, len(body))
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return [body]
+
+    def encoded_headers(self, headers, encoding, length=None):
+        headers["Content-Encoding"] = encoding
+        if length is None:
+            headers.pop("Content-Length", None)
+        else:
+            headers["Content-Length"] = str(length)
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+
+    def stream(self, app_iter, encoding):
+        encoder = self.encoders[encoding]()
+        pending = 0
+        try:
+            for chunk in app_iter:
+                data = encoder.compress(chunk)
+                pending += len(chunk)
+                if pending >= self.flush_size:
+                    data += encoder.flush()
+                    pending = 0
+                if data:
+                    yield data
+            yield encoder.finish()
+        finally:
+            close(app_iter)
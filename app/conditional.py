@@ -0,0 +1,85 @@
+"""Conditional GETs: answer 304 Not Modified from cheap version stamps.
+
+A view decorated with ``conditional(stamp)`` has ``stamp(**view_args)`` called
+first. The stamp must be cheap, for example the question bank version or a
+user's latest attempt id. It is hashed with the URL and the deploy's ETAG_SALT
+into a weak ETag. When the client already holds that ETag, the view, its
+queries and its template are skipped. Returning None from the stamp serves the
+view as usual.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from app import db
+from app.models import Attempt
+
+
+def init_app(app):
+    # without an explicit salt, the templates' modification times and the asset
+    # build stand in for the deploy, so every worker of one release agrees
+    if app.config.get("ETAG_SALT") is None:
+        stamps = [str(app.config.get("ASSETS_VERSION"))]
+        for root, _, files in os.walk(app.jinja_loader.searchpath[0]):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stamps.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        app.config["ETAG_SALT"] = hashlib.sha1("|".join(stamps).encode()).hexdigest()
+
+
+def make_etag(*parts):
+    data = repr((current_app.config["ETAG_SALT"],) + parts).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:20]
+
+
+def user_stamp():
+    """Who the page is rendered for; the navigation depends on it."""
+    if not current_user.is_authenticated:
+        return (None,)
+    return (current_user.id, current_user.isAdmin)
+
+
+def attempts_stamp(user_id):
+    """Changes whenever one of the user's attempts is added or removed."""
+    return tuple(
+        db.session.query(
+            db.func.count(Attempt.attempt_id), db.func.max(Attempt.attempt_id)
+        )
+        .filter(Attempt.user_id == user_id)
+        .one()
+    )
+
+
+def conditional(stamp, vary="Cookie"):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # flashed messages are shown once, so those pages are always rendered
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return view(*args, **kwargs)
+            parts = stamp(*args, **kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            etag = make_etag(
+                request.path,
+                request.query_string,
+                request.headers.get("Accept"),
+                *parts,
+            )
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add(vary)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,10 +1,17 @@
-from flask import render_template, flash, redirect, url_for, request
-from app import app, db
+from flask import render_template, flash, redirect, url_for, request, current_app
+from app import db
 from flask_login import current_user, login_user, logout_user, login_required
-from app.forms import LoginForm, RegistrationForm, QuizForm
-from app.models import User, Log, Question, Attempt
+from app.forms import LoginForm, RegistrationForm, quiz_form_class
+from markupsafe import Markup
+from app.models import User, Log, Question, Attempt, AttemptAnswer, DailyStat
+from app.question_bank import question_bank
+from app.log_buffer import log_buffer
+from app.pagination import decode_cursor, keyset_page
+from app import leaderboard
+from app.question_stats import question_report
+from sqlalchemy.orm import selectinload
 from werkzeug.urls import url_parse
-from datetime import datetime, date
+from datetime import datetime
 
 
 class UserController:
@@ -19,22 +26,21 @@ class UserController:
                 return render_template(
                     "login.html", title="Login", signinform=lform, signupform=rform
                 )
+            if db.session.is_modified(user):
+                db.session.commit()  # check_password upgraded an outdated hash
             login_user(user, remember=lform.remember_me.data)
-            visitor = Log(user_id=user.id)
-            db.session.add(visitor)
-            db.session.flush()
-            db.session.commit()
+            log_buffer.add(user.id)
             next_page = request.args.get("next")
             if not next_page or url_parse(next_page).netloc != "":
                 next_page = "index"
-            return redirect(url_for("index"))
+            return redirect(url_for("main.index"))
         return render_template(
             "login.html", title="Login", signinform=lform, signupform=rform
         )
 
     def logout():
         logout_user()
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
 
     def register():
         form = RegistrationForm()  # ??include current user data by default
@@ -47,14 +53,14 @@ class UserController:
             user.surname = form.surname.data
             if user is None:
                 flash("Username is unknown")
-                return redirect(url_for("index"))
+                return redirect(url_for("main.index"))
             if current_user.is_authenticated:
                 if not user.check_password(form.password.data):
                     flash("Incorrect password")
-                    return redirect(url_for("index"))
+                    return redirect(url_for("main.index"))
             # elif user.password_hash is not None:
             #     flash("User registered")
-            #     return redirect(url_for("index"))
+            #     return redirect(url_for("main.index"))
             if User.query.get(form.username.data) is not None:
                 flash("Username is already taken")
                 return render_template(
@@ -64,11 +70,8 @@ class UserController:
             db.session.flush()
             db.session.commit()
             login_user(user, remember=False)
-            visitor = Log(user_id=user.id)
-            db.session.add(visitor)
-            db.session.flush()
-            db.session.commit()
-            return redirect(url_for("index"))
+            log_buffer.add(user.id)
+            return redirect(url_for("main.index"))
         return render_template(
             "login.html", title="Register", signupform=form, signinform=lform
         )
@@ -76,79 +79,139 @@ class UserController:
 
 class ReviewController:
     def get_User_Results():
-        Rev = Attempt.query.filter_by(user_id=current_user.id).all()
-        for row in Rev:
-            row.correct = 0
-            if row.correct_1:
-                row.correct += 1
-            if row.correct_2:
-                row.correct += 1
-            if row.correct_3:
-                row.correct += 1
-            if row.correct_4:
-                row.correct += 1
-            if row.correct_5:
-                row.correct += 1
-            if row.correct_6:
-                row.correct += 1
-            if row.correct_7:
-                row.correct += 1
-
-        return render_template("review.html", title="Review", Res=Rev)
+        cursor = None
+        if request.args.get("before"):
+            try:
+                cursor = decode_cursor(request.args["before"])
+            except ValueError:
+                flash("Invalid page")
+                return redirect(url_for("main.review"))
+        query = Attempt.query.filter_by(user_id=current_user.id).options(
+            selectinload(Attempt.answers)
+        )
+        Rev, next_cursor = keyset_page(
+            query,
+            Attempt.date,
+            Attempt.attempt_id,
+            cursor,
+            current_app.config["REVIEW_PAGE_SIZE"],
+        )
+        next_url = url_for("main.review", before=next_cursor) if next_cursor else None
+        return render_template(
+            "review.html",
+            title="Review",
+            Res=Rev,
+            next_url=next_url,
+            first_page=cursor is None,
+        )
+
+
+class LeaderboardController:
+    def leaderboard():
+        cursor = None
+        if request.args.get("after"):
+            try:
+                cursor = leaderboard.decode_cursor(request.args["after"])
+            except ValueError:
+                flash("Invalid page")
+                return redirect(url_for("main.leaderboard"))
+        ranked, next_cursor = leaderboard.leaderboard_page(
+            cursor, current_app.config["LEADERBOARD_PAGE_SIZE"]
+        )
+        rank, summary = leaderboard.user_rank(current_user.id)
+        next_url = (
+            url_for("main.leaderboard", after=next_cursor) if next_cursor else None
+        )
+        return render_template(
+            "leaderboard.html",
+            title="Leaderboard",
+            ranked=ranked,
+            rank=rank,
+            summary=summary,
+            next_url=next_url,
+            first_page=cursor is None,
+        )
 
 
 class AttemptController:
     def quiz():
-        form = QuizForm()
+        bank = question_bank.get()
+        form = quiz_form_class(bank)()
         if form.is_submitted():
             attempt = Attempt()
             attempt.user_id = current_user.id
-            attempt.answer_1 = form.question_1.data
-            attempt.answer_2 = form.question_2.data
-            attempt.answer_3 = form.question_3.data
-            attempt.answer_4 = form.question_4.data
-            attempt.answer_5 = form.question_5.data
-            attempt.answer_6 = form.question_6.data
-            attempt.answer_7 = form.question_7.data.lower()
-            if attempt is None:
-                flash("Invalid Submission")
-                return render_template("quiz.html", title="Quiz", form=form)
-            db.session.add(attempt)
-            db.session.flush()
-            db.session.commit()
-            AttemptController.mark(attempt.attempt_id)
-            return redirect(url_for("review"))
-        return render_template("quiz.html", title="Quiz", form=form)
-
-    def mark(attempt_id):
-        questions = Question.query.all()
-        attempt = Attempt.query.get(attempt_id)
-        attempt.correct_1 = questions[0].answer == attempt.answer_1
-        attempt.correct_2 = questions[1].answer == attempt.answer_2
-        attempt.correct_3 = questions[2].answer == attempt.answer_3
-        attempt.correct_4 = questions[3].answer == attempt.answer_4
-        attempt.correct_5 = questions[4].answer == attempt.answer_5
-        attempt.correct_6 = questions[5].answer == attempt.answer_6
-        attempt.correct_7 = questions[6].answer == attempt.answer_7
+            attempt.set_answers(form.answers())
+            AttemptController.submit(attempt)
+            return redirect(url_for("main.review"))
+        return render_template(
+            "quiz.html",
+            title="Quiz",
+            form=form,
+            questions=AttemptController.questions_html(bank),
+        )
+
+    # the question markup only changes with the bank, so it is rendered once per
+    # bank version; quiz.html adds the per-session CSRF token around it
+    def questions_html(bank):
+        return bank.memo(
+            "quiz_html",
+            lambda bank: Markup(
+                render_template("quiz_questions.html", form=quiz_form_class(bank)())
+            ),
+        )
+
+    # grade in memory and insert the marked attempt with a single commit, so an
+    # unmarked attempt is never visible
+    def submit(attempt):
+        AttemptController.mark(attempt)
+        db.session.add(attempt)
         db.session.commit()
+        return attempt
+
+    # a batch is graded against one bank snapshot and inserted with one flush, so
+    # ORM insert batching writes the answer rows as a single executemany; the
+    # caller commits once it has read back the new ids
+    def submit_many(attempts):
+        bank = question_bank.get()
+        for attempt in attempts:
+            AttemptController.mark(attempt, bank)
+        db.session.add_all(attempts)
+        db.session.flush()
+        return attempts
+
+    def mark(attempt, bank=None):
+        if bank is None:
+            bank = question_bank.get()
+        answered = {answer.question_id for answer in attempt.answers}
+        for question_id in bank.ids:
+            if question_id not in answered:
+                attempt.answers.append(AttemptAnswer(question_id=question_id))
+        attempt.answers.sort(key=lambda answer: answer.question_id)
+        marks = bank.grade(
+            {answer.question_id: answer.answer for answer in attempt.answers}
+        )
+        for answer in attempt.answers:
+            answer.correct = marks[answer.question_id]
+        attempt.score = sum(marks.values())
+        return attempt
 
 
 class LogController:
     def stats():
-        user = User.query.get(current_user.id)
-        if user is None or not user.isAdmin:
-            return redirect(url_for("index"))
-        total_logs = Log.query.all()
-        today_logs = [log for log in total_logs if log.date.date() == date.today()]
-        total_attempts = Attempt.query.all()
-        today_attempts = [
-            attempt for attempt in total_attempts if attempt.date.date() == date.today()
-        ]
+        if not current_user.isAdmin:
+            return redirect(url_for("main.index"))
+        total_visitors, total_attempts = db.session.query(
+            db.func.coalesce(db.func.sum(DailyStat.visitors), 0),
+            db.func.coalesce(db.func.sum(DailyStat.attempts), 0),
+        ).one()
+        today = DailyStat.query.get(datetime.utcnow().date()) or DailyStat(visitors=0, attempts=0)
         return render_template(
             "stat.html",
             title="Stat",
-            total_visitors=len(total_logs),
-            today_visitors=len(today_logs),
-            total_attempts=len(total_attempts),
-            today_attempts=len(today_attempts),
+            total_visitors=total_visitors,
+            today_visitors=today.visitors,
+            total_attempts=total_attempts,
+            today_attempts=today.attempts,
+            questions=question_report(current_app.config["QUESTION_TREND_DAYS"]),
+            trend_days=current_app.config["QUESTION_TREND_DAYS"],
         )
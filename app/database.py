@@ -0,0 +1,40 @@
+"""Flask-SQLAlchemy with connection tuning for file-backed SQLite databases.
+
+Each new SQLite connection is switched to the journal mode, synchronous level
+and busy timeout from the SQLITE_* config keys, so concurrent gunicorn workers
+stop serialising on the database lock.
+"""
+from functools import partial
+
+from flask_sqlalchemy import SQLAlchemy as BaseSQLAlchemy
+from sqlalchemy import event
+
+
+def set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+class SQLAlchemy(BaseSQLAlchemy):
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith("sqlite") and sa_url.database not in (
+            None,
+            "",
+            ":memory:",
+        ):
+            options["_sqlite_pragmas"] = {
+                "journal_mode": app.config.get("SQLITE_JOURNAL_MODE", "WAL"),
+                "synchronous": app.config.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+                "busy_timeout": int(app.config.get("SQLITE_BUSY_TIMEOUT", 5000)),
+            }
+        return sa_url, options
+
+    def create_engine(self, sa_url, engine_opts):
+        pragmas = engine_opts.pop("_sqlite_pragmas", None)
+        engine = super().create_engine(sa_url, engine_opts)
+        if pragmas:
+            event.listen(engine, "connect", partial(set_sqlite_pragmas, pragmas))
+        return engine
@@ -6,7 +6,6 @@ from wtforms import (
     SubmitField,
     SelectField,
     RadioField,
-    TextField,
 )
 from wtforms.validators import DataRequired, regexp, EqualTo
 from app.models import User, Log, Question, Attempt
@@ -63,62 +62,49 @@ class RegistrationForm(FlaskForm):
 
 
 class QuizForm(FlaskForm):
-    question_1 = RadioField(
-        "Which component needs a fan or many fans to cool down?",
-        choices=[
-            "M.2 Solid State Drive",
-            "Random Access Memory",
-            "Central Processing Unit",
-            "I/O Shield",
-        ],
-    )
-    question_2 = RadioField(
-        "Which of the following is the first step of assembling a PC?",
-        choices=[
-            "Installing a CPU to a motherboard",
-            "Installing a motherboard to a PC case",
-            "Connecting power and SATA cables to various components",
-            "Applying thermal paste onto the CPU",
-        ],
-    )
-    question_3 = RadioField(
-        "In figure 1, which slots should the RAMs be installed in?",
-        choices=[
-            "8",
-            "5",
-            "7",
-            "4",
-        ],
-    )
-    question_4 = RadioField(
-        "In figure 1, which slots should the GPUs be installed in?",
-        choices=[
-            "6",
-            "3",
-            "7",
-            "5",
-        ],
-    )
-    question_5 = RadioField(
-        "In figure 1, what is 3?",
-        choices=[
-            "6-pin connectors",
-            "HDMI",
-            "Bluetooth",
-            "SATA connectors",
-        ],
-    )
-    question_6 = RadioField(
-        "Do you need to apply thermal paste if you are using stock cooler for your CPU?",
-        choices=[
-            "Yes",
-            "No",
-            "I don't know",
-            "I do not need a cooler for my CPU",
-        ],
-    )
-    question_7 = TextField(
-        "A ___________ is a main printed circuit board that allows communications between different electronic components.",
-        validators=[regexp("^\w{11}$")],
-    )
+    """Base class of the quiz forms that quiz_form_class builds from the question bank.
+
+    Fields are named question_1, question_2, ... in bank order, and
+    ``question_ids`` maps them back to the questions."""
+
+    question_ids = ()
+    typed_answers = {}
     submit = SubmitField("Submit Answers")
+
+    def question_fields(self):
+        return [self[f"question_{n}"] for n in range(1, len(self.question_ids) + 1)]
+
+    def answers(self):
+        """Return the submission as a {question_id: answer} mapping."""
+        answers = {}
+        for question_id, field in zip(self.question_ids, self.question_fields()):
+            answer = field.data
+            if question_id in self.typed_answers and answer is not None:
+                # typed answers are marked regardless of case and spacing
+                answer = answer.strip()
+                if answer.lower() == self.typed_answers[question_id].lower():
+                    answer = self.typed_answers[question_id]
+            answers[question_id] = answer
+        return answers
+
+
+def _build_quiz_form(bank):
+    fields = {"question_ids": bank.ids, "typed_answers": {}}
+    for position, question in enumerate(bank.questions, 1):
+        name = f"question_{position}"
+        if question["answer_type"] == "MCQ":
+            choices = [
+                question[f"answer_choice_{n}"]
+                for n in range(1, 5)
+                if question[f"answer_choice_{n}"]
+            ]
+            fields[name] = RadioField(question["question"], choices=choices)
+        else:
+            fields[name] = StringField(question["question"])
+            fields["typed_answers"][question["question_id"]] = question["answer"]
+    return type("QuizForm", (QuizForm,), fields)
+
+
+def quiz_form_class(bank):
+    """The quiz form class for a question bank snapshot, built once per version."""
+    return bank.memo("quiz_form", _build_quiz_form)
@@ -0,0 +1,136 @@
+"""Count the SQL statements and database time spent on each request.
+
+Every statement run through any engine is recorded by the ``QueryStats`` that
+are active in the current thread. A request gets its own stats while
+QUERY_STATS is on; the same statement text run QUERY_REPEAT_THRESHOLD or more
+times in one request is logged as a likely N+1. ``query_budget`` lets tests and
+scripts fail when a block of code runs more statements than expected.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats(object):
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold=2):
+        """Statements run at least ``threshold`` times, most frequent first."""
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def report(self):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        lines += [
+            f"  {count}x {statement}"
+            for statement, count in self.statements.most_common()
+        ]
+        return "\n".join(lines)
+
+
+def _active():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements run inside the block into a fresh QueryStats."""
+    stats = QueryStats()
+    stack = _active()
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    """Raise QueryBudgetExceeded if the block runs more than ``max_queries``
+    statements, or any one statement more than ``max_repeats`` times."""
+    with count_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"expected at most {max_queries} queries, got {stats.report()}"
+        )
+    if max_repeats is not None and stats.repeated(max_repeats + 1):
+        raise QueryBudgetExceeded(
+            f"expected no statement more than {max_repeats} times, got {stats.report()}"
+        )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _active():
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    stack = _active()
+    if not stack or not conn.info.get("query_start"):
+        return
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    for stats in stack:
+        stats.record(statement, duration)
+
+
+def current_stats():
+    """The QueryStats of the request being handled, if it is being counted."""
+    return g.get("query_stats")
+
+
+def init_app(app):
+    if not app.config["QUERY_STATS"]:
+        return
+    threshold = app.config["QUERY_REPEAT_THRESHOLD"]
+
+    @app.before_request
+    def _start_counting():
+        g.query_stats = QueryStats()
+        _active().append(g.query_stats)
+
+    @app.after_request
+    def _report_queries(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        repeated = stats.repeated(threshold) if threshold else []
+        for statement, count in repeated:
+            app.logger.warning("possible N+1: %dx %s", count, statement)
+        if app.config["QUERY_STATS_HEADER"]:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"'
+            )
+        return response
+
+    @app.teardown_request
+    def _stop_counting(exc):
+        stats = g.pop("query_stats", None)
+        if stats is not None and stats in _active():
+            _active().remove(stats)
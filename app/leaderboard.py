@@ -0,0 +1,84 @@
+"""Leaderboard pages read from the user_summaries table.
+
+Players are ranked by best score, and players with the same best score by who
+reached it first. Tied scores share a rank. Pages are walked with a cursor down
+ix_user_summaries_rank, and the cursor carries the last rank and position, so
+any page costs O(page) however deep it is.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models import UserSummary
+
+RANK_ORDER = (
+    UserSummary.best_score.desc(),
+    UserSummary.best_at,
+    UserSummary.user_id,
+)
+
+
+def encode_cursor(rank, position, summary):
+    return "_".join(
+        (
+            str(rank),
+            str(position),
+            str(summary.best_score),
+            summary.best_at.isoformat(),
+            summary.user_id,
+        )
+    )
+
+
+def decode_cursor(cursor):
+    """Split a cursor into its parts, raising ValueError when it is malformed."""
+    rank, position, score, best_at, user_id = cursor.split("_", 4)
+    return int(rank), int(position), int(score), datetime.fromisoformat(best_at), user_id
+
+
+def ranked_after(score, best_at, user_id):
+    """The filter for the summaries ranked below the given one."""
+    return or_(
+        UserSummary.best_score < score,
+        and_(
+            UserSummary.best_score == score,
+            or_(
+                UserSummary.best_at > best_at,
+                and_(UserSummary.best_at == best_at, UserSummary.user_id > user_id),
+            ),
+        ),
+    )
+
+
+def leaderboard_page(cursor=None, limit=20):
+    """Return ([(rank, summary)], next_cursor) for the page after ``cursor``."""
+    query = UserSummary.query
+    rank, position, score = 0, 0, None
+    if cursor is not None:
+        rank, position, score, best_at, user_id = cursor
+        query = query.filter(ranked_after(score, best_at, user_id))
+    summaries = query.order_by(*RANK_ORDER).limit(limit + 1).all()
+    ranked = []
+    for summary in summaries[:limit]:
+        position += 1
+        if summary.best_score != score:
+            rank, score = position, summary.best_score
+        ranked.append((rank, summary))
+    if len(summaries) <= limit:
+        return ranked, None
+    return ranked, encode_cursor(rank, position, ranked[-1][1])
+
+
+def user_rank(user_id):
+    """Return (rank, summary) for one user, or (None, None) before their first attempt."""
+    summary = UserSummary.query.get(user_id)
+    if summary is None:
+        return None, None
+    ahead = (
+        db.session.query(db.func.count())
+        .select_from(UserSummary)
+        .filter(UserSummary.best_score > summary.best_score)
+        .scalar()
+    )
+    return ahead + 1, summary
@@ -0,0 +1,108 @@
+"""Write-behind buffer for visitor logs.
+
+Logins and registrations queue a Log row here instead of committing it in the
+request. A background thread inserts the queued rows in one transaction every
+LOG_BUFFER_INTERVAL seconds, or sooner once LOG_BUFFER_SIZE rows are waiting.
+The rows go through the ORM session, so the daily visitor counters in
+``app.rollups`` are updated in the same transaction. Whatever is left is
+flushed when the worker exits.
+
+LOG_BUFFER_MODE = "sync" inserts and commits each row in the request instead,
+as the tests do.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from app import db
+from app.models import Log
+
+
+class LogBuffer(object):
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = "sync"
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config["LOG_BUFFER_MODE"]
+        self.size = app.config["LOG_BUFFER_SIZE"]
+        self.interval = app.config["LOG_BUFFER_INTERVAL"]
+        self.max_pending = app.config["LOG_BUFFER_MAX_PENDING"]
+        if self.mode == "async" and not self._registered:
+            atexit.register(self.close)
+            self._registered = True
+
+    def add(self, user_id):
+        """Record a visit by ``user_id``, stamped now."""
+        if self.mode == "sync":
+            db.session.add(Log(user_id=user_id))
+            db.session.commit()
+            return
+        with self._lock:
+            self._pending.append({"user_id": user_id, "date": datetime.utcnow()})
+            full = len(self._pending) >= self.size
+        self._start()
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        # threads do not survive a fork, so each gunicorn worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name="log-buffer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert the queued logs in one transaction; returns how many."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        with self.app.app_context():
+            try:
+                db.session.add_all(Log(**row) for row in rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Could not write %d visitor logs", len(rows))
+                with self._lock:
+                    # retried on the next flush; the oldest go first if it keeps failing
+                    self._pending = (rows + self._pending)[-self.max_pending :]
+                return 0
+        return len(rows)
+
+    def close(self):
+        """Stop the background thread and write whatever is queued."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._stopping = True
+            self._wake.set()
+            thread.join()
+            self._thread = None
+        self.flush()
+
+
+log_buffer = LogBuffer()
@@ -0,0 +1,245 @@
+"""Request metrics served at /metrics in the Prometheus text format.
+
+Every request is counted by endpoint, method and status, its latency goes into
+a histogram, and the database time and query count come from
+``app.instrumentation``. Cache hit and miss counters are read from the caches
+passed to ``track_cache``.
+
+With METRICS_DIR set, each gunicorn worker writes its totals to
+``metrics-<pid>.json`` in that directory at most every METRICS_FLUSH_INTERVAL
+seconds. /metrics adds up every worker's file, so any worker can answer a
+scrape. Without METRICS_DIR, /metrics reports only the worker that serves it.
+The endpoint answers logged-in admins, and requests from localhost unless
+METRICS_ALLOW_LOCALHOST is off (do that behind a reverse proxy on the same host).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import abort, g, request
+from flask_login import current_user
+
+from app.instrumentation import current_stats
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+
+def empty_totals():
+    return {
+        "requests": defaultdict(int),
+        "latency": defaultdict(lambda: [0] * len(BUCKETS) + [0, 0.0]),
+        "db_seconds": defaultdict(float),
+        "db_queries": defaultdict(int),
+    }
+
+
+def merge(totals, data):
+    """Add one worker's dumped totals into ``totals``."""
+    for endpoint, method, status, count in data["requests"]:
+        totals["requests"][(endpoint, method, status)] += count
+    for endpoint, method, values in data["latency"]:
+        current = totals["latency"][(endpoint, method)]
+        for index, value in enumerate(values):
+            current[index] += value
+    for endpoint, seconds in data["db_seconds"]:
+        totals["db_seconds"][endpoint] += seconds
+    for endpoint, queries in data["db_queries"]:
+        totals["db_queries"][endpoint] += queries
+
+
+def label(**labels):
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def render(totals, caches):
+    lines = [
+        "# HELP pc_wiki_requests_total Requests handled.",
+        "# TYPE pc_wiki_requests_total counter",
+    ]
+    for (endpoint, method, status), count in sorted(totals["requests"].items()):
+        labels = label(endpoint=endpoint, method=method, status=status)
+        lines.append(f"pc_wiki_requests_total{labels} {count}")
+
+    lines += [
+        "# HELP pc_wiki_request_duration_seconds Time spent building the response.",
+        "# TYPE pc_wiki_request_duration_seconds histogram",
+    ]
+    for (endpoint, method), values in sorted(totals["latency"].items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, values):
+            cumulative += count
+            labels = label(endpoint=endpoint, method=method, le=bound)
+            lines.append(
+                f"pc_wiki_request_duration_seconds_bucket{labels} {cumulative}"
+            )
+        count, seconds = values[len(BUCKETS)], values[len(BUCKETS) + 1]
+        labels = label(endpoint=endpoint, method=method, le="+Inf")
+        lines.append(f"pc_wiki_request_duration_seconds_bucket{labels} {count}")
+        labels = label(endpoint=endpoint, method=method)
+        lines.append(f"pc_wiki_request_duration_seconds_sum{labels} {seconds}")
+        lines.append(f"pc_wiki_request_duration_seconds_count{labels} {count}")
+
+    lines += [
+        "# HELP pc_wiki_db_duration_seconds_total Database time spent by requests.",
+        "# TYPE pc_wiki_db_duration_seconds_total counter",
+    ]
+    for endpoint, seconds in sorted(totals["db_seconds"].items()):
+        lines.append(
+            f"pc_wiki_db_duration_seconds_total{label(endpoint=endpoint)} {seconds}"
+        )
+    lines += [
+        "# HELP pc_wiki_db_queries_total Queries run by requests.",
+        "# TYPE pc_wiki_db_queries_total counter",
+    ]
+    for endpoint, queries in sorted(totals["db_queries"].items()):
+        lines.append(f"pc_wiki_db_queries_total{label(endpoint=endpoint)} {queries}")
+
+    for kind in ("hits", "misses"):
+        lines += [
+            f"# HELP pc_wiki_cache_{kind}_total Cache lookups that {kind[:-2]}.",
+            f"# TYPE pc_wiki_cache_{kind}_total counter",
+        ]
+        for name, stats in sorted(caches.items()):
+            lines.append(f"pc_wiki_cache_{kind}_total{label(cache=name)} {stats[kind]}")
+    return "\n".join(lines) + "\n"
+
+
+class Metrics(object):
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.totals = empty_totals()
+        self.caches = {}
+        self.directory = None
+        self.flush_interval = 5
+        self.allow_localhost = True
+        self._flushed_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config["METRICS_ENABLED"]:
+            return
+        self.directory = app.config["METRICS_DIR"]
+        self.flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        self.allow_localhost = app.config["METRICS_ALLOW_LOCALHOST"]
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+        app.before_request(self._start_timer)
+        app.after_request(self._observe)
+        app.add_url_rule("/metrics", "metrics", self.view)
+
+    def track_cache(self, name, cache):
+        """Report the hits and misses from ``cache.stats()`` under ``name``."""
+        self.caches[name] = cache
+
+    def _start_timer(self):
+        g.metrics_start = time.perf_counter()
+
+    def _observe(self, response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        stats = current_stats()
+        self.observe(
+            request.endpoint or "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            stats.duration if stats is not None else 0.0,
+            stats.count if stats is not None else 0,
+        )
+        return response
+
+    def observe(self, endpoint, method, status, seconds, db_seconds=0.0, queries=0):
+        with self._lock:
+            self.totals["requests"][(endpoint, method, str(status))] += 1
+            values = self.totals["latency"][(endpoint, method)]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[index] += 1
+                    break
+            values[len(BUCKETS)] += 1
+            values[len(BUCKETS) + 1] += seconds
+            self.totals["db_seconds"][endpoint] += db_seconds
+            self.totals["db_queries"][endpoint] += queries
+        if (
+            self.directory
+            and time.monotonic() - self._flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def dump(self):
+        """This worker's totals and cache counters as JSON-friendly lists."""
+        with self._lock:
+            totals = self.totals
+            data = {
+                "requests": [
+                    list(key) + [count] for key, count in totals["requests"].items()
+                ],
+                "latency": [
+                    list(key) + [list(values)] for key, values in totals["latency"].items()
+                ],
+                "db_seconds": list(totals["db_seconds"].items()),
+                "db_queries": list(totals["db_queries"].items()),
+            }
+        data["caches"] = {name: cache.stats() for name, cache in self.caches.items()}
+        return data
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"metrics-{pid or os.getpid()}.json")
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._flushed_at = time.monotonic()
+        path = self._path()
+        # write then rename so a scrape never reads half a file
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.dump(), file)
+        os.replace(path + ".tmp", path)
+
+    def collect(self):
+        """Totals and cache counters summed over every worker."""
+        workers = [self.dump()]
+        if self.directory:
+            own = self._path()
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as file:
+                        workers.append(json.load(file))
+                except (OSError, ValueError):
+                    continue  # a worker is replacing its file
+        totals = empty_totals()
+        caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+        for data in workers:
+            merge(totals, data)
+            for name, stats in data["caches"].items():
+                caches[name]["hits"] += stats["hits"]
+                caches[name]["misses"] += stats["misses"]
+        return totals, caches
+
+    def view(self):
+        local = self.allow_localhost and request.remote_addr in LOCAL_ADDRESSES
+        allowed = local or (
+            current_user.is_authenticated and current_user.isAdmin
+        )
+        if not allowed:
+            abort(403)
+        totals, caches = self.collect()
+        return (
+            render(totals, caches),
+            200,
+            {"Content-Type": "text/plain; version=0.0.4"},
+        )
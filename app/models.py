@@ -1,15 +1,28 @@
 import base64
-from app import db, login
-from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
+from app import db, login, token_cache, user_cache, password_hasher
 from flask_login import UserMixin
-from flask import url_for
+from flask import url_for, current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta
 import os
+import time
 
 
+# users are rebuilt from a short-lived cache and merged into the session, so the
+# session's identity map de-duplicates any further lookups within the request
 @login.user_loader
 def load_user(id):
-    return User.query.get(id)
+    snapshot = user_cache.get(id)
+    if snapshot is not None:
+        return User.from_snapshot(snapshot)
+    user = User.query.get(id)
+    if user is not None:
+        user_cache.set(id, user.snapshot())
+    return user
 
 
 class User(UserMixin, db.Model):
@@ -23,19 +36,31 @@ class User(UserMixin, db.Model):
     # token authetication for api
     token = db.Column(db.String(32), index=True, unique=True)
     token_expiration = db.Column(db.DateTime)
+    # signed tokens carry the generation they were issued under; bumping it
+    # revokes every outstanding one
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     attempts = db.relationship("Attempt", backref="user", lazy="dynamic")
     logs = db.relationship("Log", backref="user", lazy="dynamic")
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash is None:
+            return False
+        if not password_hasher.check(self.password_hash, password):
+            return False
+        # upgrade hashes made under an older policy; the caller commits the change
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     ###Token support methods for api
 
     def get_token(self, expires_in=3600):
+        if current_app.config["TOKEN_MODE"] == "signed":
+            return self.get_signed_token(expires_in)
         now = datetime.utcnow()
         if self.token and self.token_expiration > now + timedelta(seconds=60):
             return self.token
@@ -45,15 +70,86 @@ class User(UserMixin, db.Model):
         return self.token
 
     def revoke_token(self):
+        if current_app.config["TOKEN_MODE"] == "signed":
+            self.token_generation = (self.token_generation or 0) + 1
+            return
         self.token_expiration = datetime.utcnow() - timedelta(seconds=1)
 
     @staticmethod
     def check_token(token):
+        if current_app.config["TOKEN_MODE"] == "signed":
+            return User.check_signed_token(token)
+        now = datetime.utcnow()
+        cached = token_cache.get(token)
+        if cached is not None:
+            # only the owner is cached; the row comes through user_cache, so a
+            # revocation on another worker is seen within USER_CACHE_TTL
+            user_id, expiration = cached
+            if expiration < now:
+                return None
+            user = load_user(user_id)
+            if user is None or user.token != token or user.token_expiration < now:
+                return None
+            return user
         user = User.query.filter_by(token=token).first()
-        if user is None or user.token_expiration < datetime.utcnow():
+        if user is None or user.token_expiration < now:
+            return None
+        user_cache.set(user.id, user.snapshot())
+        token_cache.set(
+            token,
+            (user.id, user.token_expiration),
+            ttl=min(
+                token_cache.backend.ttl,
+                int((user.token_expiration - now).total_seconds()) + 1,
+            ),
+        )
+        return user
+
+    @staticmethod
+    def token_serializer():
+        return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="api-token")
+
+    def get_signed_token(self, expires_in=3600):
+        return User.token_serializer().dumps(
+            {
+                "id": self.id,
+                "gen": self.token_generation or 0,
+                "exp": int(time.time()) + expires_in,
+            }
+        )
+
+    @staticmethod
+    def check_signed_token(token):
+        # the signature and expiry are checked without the database; the
+        # generation is compared against the cached user row, so a revocation
+        # made on another worker is seen once that row expires (USER_CACHE_TTL)
+        try:
+            data = User.token_serializer().loads(token)
+            user_id, generation, expiration = data["id"], data["gen"], data["exp"]
+        except (BadSignature, KeyError, TypeError):
+            return None
+        if expiration < time.time():
+            return None
+        user = load_user(user_id)
+        if user is None or (user.token_generation or 0) != generation:
             return None
         return user
 
+    ###Caching support methods
+
+    def snapshot(self):
+        """Return the column values needed to rebuild this user from a cache."""
+        return {attr.key: getattr(self, attr.key) for attr in inspect(User).column_attrs}
+
+    @staticmethod
+    def from_snapshot(data):
+        """Attach a cached user to the session without querying for it."""
+        user = User()
+        for key, value in data.items():
+            set_committed_value(user, key, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
     def to_dict(self):
         data = {
             "id": self.id,
@@ -86,94 +182,113 @@ class User(UserMixin, db.Model):
         return self.first_name + " " + self.surname
 
 
+# cached users and token lookups are dropped once a change to the user row is committed
+@event.listens_for(db.session, "before_flush")
+def _note_stale_users(session, flush_context, instances):
+    stale = session.info.setdefault("stale_users", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            tokens = set(inspect(obj).attrs.token.history.deleted) | {obj.token}
+            stale.update(("token", token) for token in tokens)
+            stale.add(("user", obj.id))
+
+
+@event.listens_for(db.session, "after_commit")
+def _drop_stale_users(session):
+    for kind, key in session.info.pop("stale_users", ()):
+        if key is None:
+            continue
+        if kind == "token":
+            token_cache.delete(key)
+        else:
+            user_cache.delete(key)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _keep_users_after_rollback(session):
+    session.info.pop("stale_users", None)
+
+
 class Attempt(db.Model):
     __tablename__ = "attempts"
     attempt_id = db.Column(db.Integer, primary_key=True)
-    answer_1 = db.Column(db.String(256), nullable=True)
-    answer_2 = db.Column(db.String(256), nullable=True)
-    answer_3 = db.Column(db.String(256), nullable=True)
-    answer_4 = db.Column(db.String(256), nullable=True)
-    answer_5 = db.Column(db.String(256), nullable=True)
-    answer_6 = db.Column(db.String(256), nullable=True)
-    answer_7 = db.Column(db.String(256), nullable=True)
-    correct_1 = db.Column(db.Boolean, default=False)
-    correct_2 = db.Column(db.Boolean, default=False)
-    correct_3 = db.Column(db.Boolean, default=False)
-    correct_4 = db.Column(db.Boolean, default=False)
-    correct_5 = db.Column(db.Boolean, default=False)
-    correct_6 = db.Column(db.Boolean, default=False)
-    correct_7 = db.Column(db.Boolean, default=False)
+    score = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     date = db.Column(db.DateTime, index=True, default=datetime.utcnow)  # date and time
     user_id = db.Column(db.String(128), db.ForeignKey("users.id"))
+    # keyset pagination of a user's attempts walks this index
+    __table_args__ = (db.Index("ix_attempts_user_date", "user_id", "date", "attempt_id"),)
+
+    answers = db.relationship(
+        "AttemptAnswer",
+        backref="attempt",
+        order_by="AttemptAnswer.question_id",
+        cascade="all, delete-orphan",
+    )
+
+    def set_answers(self, answers):
+        """Replace the answers with a {question_id: answer} mapping."""
+        self.answers = [
+            AttemptAnswer(question_id=int(question_id), answer=answer)
+            for question_id, answer in answers.items()
+        ]
 
     def to_dict(self):
         data = {
             "attempt_id": self.attempt_id,
-            "answer_1": self.answer_1,
-            "answer_2": self.answer_2,
-            "answer_3": self.answer_3,
-            "answer_4": self.answer_4,
-            "answer_5": self.answer_5,
-            "answer_6": self.answer_6,
-            "answer_7": self.answer_7,
-            "correct_1": self.correct_1,
-            "correct_2": self.correct_2,
-            "correct_3": self.correct_3,
-            "correct_4": self.correct_4,
-            "correct_5": self.correct_5,
-            "correct_6": self.correct_6,
-            "correct_7": self.correct_7,
+            "score": self.score,
+            "answers": [answer.to_dict() for answer in self.answers],
             "date": self.date,
             "user_id": self.user_id,
         }
         return data
 
-    def is_committed(self):
-        return (self.user_id is not None) & (self.answer_1 == "potato")
-
     def from_dict(self, data):
         if "attempt_id" in data:
             self.attempt_id = data["attempt_id"]
-        if "answer_1" in data:
-            self.answer_1 = data["answer_1"]
-        if "answer_2" in data:
-            self.answer_2 = data["answer_2"]
-        if "answer_3" in data:
-            self.answer_3 = data["answer_3"]
-        if "answer_4" in data:
-            self.answer_4 = data["answer_4"]
-        if "answer_5" in data:
-            self.answer_5 = data["answer_5"]
-        if "answer_6" in data:
-            self.answer_6 = data["answer_6"]
-        if "answer_7" in data:
-            self.answer_7 = data["answer_7"]
-        if "correct_1" in data:
-            self.correct_1 = data["correct_1"]
-        if "correct_2" in data:
-            self.correct_2 = data["correct_2"]
-        if "correct_3" in data:
-            self.correct_3 = data["correct_3"]
-        if "correct_4" in data:
-            self.correct_4 = data["correct_4"]
-        if "correct_5" in data:
-            self.correct_5 = data["correct_5"]
-        if "correct_6" in data:
-            self.correct_6 = data["correct_6"]
-        if "correct_7" in data:
-            self.correct_7 = data["correct_7"]
+        if "answers" in data:
+            answers = data["answers"]
+            # accept [{"question_id": .., "answer": ..}] as well as {question_id: answer}
+            if isinstance(answers, list):
+                answers = {item["question_id"]: item.get("answer") for item in answers}
+            self.set_answers(answers)
         if "date" in data:
-            self.date = data["date"]
+            # offline clients send the time the attempt was taken as ISO 8601
+            date = data["date"]
+            self.date = datetime.fromisoformat(date) if isinstance(date, str) else date
         if "user_id" in data:
             self.user_id = data["user_id"]
 
     def __repr__(self):
-        return f"[attempt_id: {self.attempt_id}, date: {self.date}, name: {User.query.get(self.user_id).__str__()}]"
+        return f"[attempt_id: {self.attempt_id}, date: {self.date}, user_id: {self.user_id}]"
+
+
+class AttemptAnswer(db.Model):
+    __tablename__ = "attempt_answers"
+    attempt_id = db.Column(
+        db.Integer, db.ForeignKey("attempts.attempt_id"), primary_key=True
+    )
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("questions.question_id"), primary_key=True
+    )
+    answer = db.Column(db.String(256), nullable=True)
+    correct = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        data = {
+            "question_id": self.question_id,
+            "answer": self.answer,
+            "correct": self.correct,
+        }
+        return data
+
+    def __repr__(self):
+        return f"[attempt_id: {self.attempt_id}, question_id: {self.question_id}, answer: {self.answer}, correct: {self.correct}]"
 
 
 class Question(db.Model):
     __tablename__ = "questions"
     question_id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), index=True, unique=True)  # stable id for seeding
     question = db.Column(db.String(256))
     answer_type = db.Column(db.String(256))
     answer_choice_1 = db.Column(db.String(256), nullable=True)
@@ -183,9 +298,31 @@ class Question(db.Model):
     answer = db.Column(db.String(256))
     date = db.Column(db.DateTime, index=True, default=datetime.utcnow)  # date and time
 
+    CONTENT_FIELDS = (
+        "question",
+        "answer_type",
+        "answer_choice_1",
+        "answer_choice_2",
+        "answer_choice_3",
+        "answer_choice_4",
+        "answer",
+    )
+
+    @staticmethod
+    def hash_content(data):
+        """Hash the fields that make up a question, ignoring ids and dates."""
+        content = "\x1f".join(
+            str(data.get(field) or "") for field in Question.CONTENT_FIELDS
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def content_hash(self):
+        return Question.hash_content(self.to_dict())
+
     def to_dict(self):
         data = {
             "question_id": self.question_id,
+            "key": self.key,
             "question": self.question,
             "answer_type": self.answer_type,
             "answer_choice_1": self.answer_choice_1,
@@ -200,6 +337,8 @@ class Question(db.Model):
     def from_dict(self, data):
         if "question_id" in data:
             self.question_id = data["question_id"]
+        if "key" in data:
+            self.key = data["key"]
         if "question" in data:
             self.question = data["question"]
         if "answer_type" in data:
@@ -240,9 +379,115 @@ class Log(db.Model):
         if "log_id" in data:
             self.log_id = data["log_id"]
         if "date" in data:
-            self.date = data["date"]
+            # the visit time may arrive as an ISO 8601 string
+            date = data["date"]
+            self.date = datetime.fromisoformat(date) if isinstance(date, str) else date
         if "user_id" in data:
             self.user_id = data["user_id"]
 
     def __repr__(self):
-        return f"[log_id: {self.log_id}, user_id: {self.user_id}, date: {self.date}]"
\ No newline at end of file
+        return f"[log_id: {self.log_id}, user_id: {self.user_id}, date: {self.date}]"
+
+
+class DailyStat(db.Model):
+    __tablename__ = "daily_stats"
+    day = db.Column(db.Date, primary_key=True)
+    visitors = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        data = {
+            "day": self.day,
+            "visitors": self.visitors,
+            "attempts": self.attempts,
+        }
+        return data
+
+    def __repr__(self):
+        return f"[day: {self.day}, visitors: {self.visitors}, attempts: {self.attempts}]"
+
+
+class UserSummary(db.Model):
+    """Per-user attempt totals, kept up to date by ``app.rollups``."""
+
+    __tablename__ = "user_summaries"
+    user_id = db.Column(db.String(128), db.ForeignKey("users.id"), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    best_at = db.Column(db.DateTime, nullable=False)  # when best_score was first reached
+    last_score = db.Column(db.Integer, nullable=False, default=0)
+    last_attempt = db.Column(db.DateTime, nullable=False)
+    # leaderboard pages walk this index in order
+    __table_args__ = (db.Index("ix_user_summaries_rank", best_score.desc(), best_at, user_id),)
+
+    def to_dict(self):
+        data = {
+            "user_id": self.user_id,
+            "attempts": self.attempts,
+            "best_score": self.best_score,
+            "last_score": self.last_score,
+            "last_attempt": self.last_attempt,
+        }
+        return data
+
+    def __repr__(self):
+        return f"[user_id: {self.user_id}, attempts: {self.attempts}, best_score: {self.best_score}, last_score: {self.last_score}]"
+
+
+class QuestionStat(db.Model):
+    """Running answer counts for one question, kept up to date by ``app.rollups``."""
+
+    __tablename__ = "question_stats"
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("questions.question_id"), primary_key=True
+    )
+    answered = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    blank = db.Column(db.Integer, nullable=False, default=0)
+    # how often each answer_choice_<n> was picked; other counts typed answers
+    # and anything that is not one of the choices
+    choice_1 = db.Column(db.Integer, nullable=False, default=0)
+    choice_2 = db.Column(db.Integer, nullable=False, default=0)
+    choice_3 = db.Column(db.Integer, nullable=False, default=0)
+    choice_4 = db.Column(db.Integer, nullable=False, default=0)
+    other = db.Column(db.Integer, nullable=False, default=0)
+
+    COUNTERS = (
+        "answered",
+        "correct",
+        "blank",
+        "choice_1",
+        "choice_2",
+        "choice_3",
+        "choice_4",
+        "other",
+    )
+
+    def to_dict(self):
+        data = {"question_id": self.question_id}
+        data.update((name, getattr(self, name) or 0) for name in self.COUNTERS)
+        return data
+
+    def __repr__(self):
+        return f"[question_id: {self.question_id}, answered: {self.answered}, correct: {self.correct}]"
+
+
+class QuestionDailyStat(db.Model):
+    __tablename__ = "question_daily_stats"
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("questions.question_id"), primary_key=True
+    )
+    day = db.Column(db.Date, primary_key=True, index=True)
+    answered = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        data = {
+            "day": self.day,
+            "answered": self.answered,
+            "correct": self.correct,
+        }
+        return data
+
+    def __repr__(self):
+        return f"[question_id: {self.question_id}, day: {self.day}, answered: {self.answered}, correct: {self.correct}]"
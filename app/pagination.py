@@ -0,0 +1,47 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are selected with a ``WHERE key > cursor`` style condition on indexed
+columns instead of an OFFSET, so every page costs the same no matter how deep
+into the results it is.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(date, key):
+    return f"{date.isoformat()}_{key}"
+
+
+def decode_cursor(cursor):
+    """Split a cursor into (date, key), raising ValueError when it is malformed."""
+    date, _, key = cursor.rpartition("_")
+    return datetime.fromisoformat(date), int(key)
+
+
+def keyset_page(query, date_column, key_column, cursor=None, limit=20):
+    """Return (rows, next_cursor) for the page after ``cursor``, newest first."""
+    if cursor is not None:
+        date, key = cursor
+        query = query.filter(
+            or_(date_column < date, and_(date_column == date, key_column < key))
+        )
+    rows = query.order_by(date_column.desc(), key_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(
+        getattr(last, date_column.key), getattr(last, key_column.key)
+    )
+
+
+def id_page(query, key_column, after=None, limit=100):
+    """Return (rows, next_after) for the rows whose key follows ``after``, in key order."""
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, getattr(rows[-1], key_column.key)
@@ -0,0 +1,65 @@
+"""Password hashing with a configurable policy and an optional concurrency cap.
+
+PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH describe the current policy;
+hashes made with anything else are reported by ``needs_rehash`` so they can be
+replaced on the next successful login.
+
+Hashes run in the request thread. PASSWORD_HASH_MAX_CONCURRENCY caps how many
+run at once in a worker process, so a burst of logins cannot take every core
+from the threads serving other requests; the rest wait their turn. 0, the
+default, leaves hashing unlimited.
+"""
+import os
+import threading
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+
+class PasswordHasher(object):
+    def __init__(self, app=None):
+        self.method = f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}"
+        self.salt_length = 8
+        self.max_concurrency = 0
+        self._slots = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        # stored hashes always spell out the iteration count
+        if self.method.startswith("pbkdf2:") and self.method.count(":") == 1:
+            self.method += f":{DEFAULT_PBKDF2_ITERATIONS}"
+        self.salt_length = app.config["PASSWORD_SALT_LENGTH"]
+        self.max_concurrency = app.config["PASSWORD_HASH_MAX_CONCURRENCY"]
+        self._slots = None
+
+    @property
+    def slots(self):
+        # made per process, so a fork never inherits a slot held by the parent
+        if self._slots is None or self._pid != os.getpid():
+            self._slots = threading.BoundedSemaphore(self.max_concurrency)
+            self._pid = os.getpid()
+        return self._slots
+
+    def _limited(self, func, *args):
+        if not self.max_concurrency:
+            return func(*args)
+        with self.slots:
+            return func(*args)
+
+    def hash(self, password):
+        return self._limited(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, pwhash, password):
+        return self._limited(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        if pwhash.count("$") < 2:
+            return True
+        method, salt, _ = pwhash.split("$", 2)
+        return method != self.method or len(salt) != self.salt_length
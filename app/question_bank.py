@@ -0,0 +1,133 @@
+"""Per-worker cache of the question bank.
+
+The bank is loaded once and kept as an immutable snapshot holding the serialised
+questions and the answer key, plus anything derived from them with ``memo``
+(the quiz form class and its rendered markup). The snapshot is dropped whenever a transaction that
+touched the questions table commits, so marking and ``/api/quiz/`` never have to
+query the database on the hot path. Changes made by other workers are picked up
+once QUESTION_BANK_TTL seconds have passed; a reload that finds the same
+questions keeps the old snapshot and its memos.
+"""
+import hashlib
+import threading
+import time
+
+from flask import json
+from sqlalchemy import event
+
+from app import db
+from app.models import Question
+
+
+class BankSnapshot(object):
+    def __init__(self, questions):
+        self.questions = [question.to_dict() for question in questions]
+        self.ids = tuple(question["question_id"] for question in self.questions)
+        self.answers = tuple(question["answer"] for question in self.questions)
+        self.answer_key = dict(zip(self.ids, self.answers))
+        self.data = {str(question["question_id"]): question for question in self.questions}
+        self.json = json.dumps(self.data)
+        self.version = hashlib.sha1(self.json.encode("utf-8")).hexdigest()[:16]
+        self._memo = {}
+
+    def grade(self, answers):
+        """Mark a {question_id: answer} mapping, returning {question_id: correct}."""
+        return {
+            question_id: answer is not None
+            and answer == self.answer_key.get(question_id)
+            for question_id, answer in answers.items()
+        }
+
+    def memo(self, name, build):
+        """Return ``build(self)``, computed once for this snapshot."""
+        try:
+            return self._memo[name]
+        except KeyError:
+            return self._memo.setdefault(name, build(self))
+
+    def __len__(self):
+        return len(self.questions)
+
+
+class QuestionBank(object):
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # workers only see each other's changes once the ttl runs out
+        self.ttl = app.config.get("QUESTION_BANK_TTL")
+        self.invalidate()
+
+    def _fresh(self, snapshot):
+        return snapshot is not None and (
+            not self.ttl or time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def get(self):
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            questions = Question.query.order_by(Question.question_id).all()
+            snapshot = BankSnapshot(questions)
+            if self._snapshot is not None and self._snapshot.version == snapshot.version:
+                snapshot = self._snapshot  # unchanged, so keep the built forms
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": snapshot.version if snapshot is not None else None,
+        }
+
+
+question_bank = QuestionBank()
+
+
+def _touches_questions(objects):
+    return any(isinstance(obj, Question) for obj in objects)
+
+
+@event.listens_for(db.session, "after_flush")
+def _note_question_changes(session, flush_context):
+    changed = (session.new, session.dirty, session.deleted)
+    if any(_touches_questions(objects) for objects in changed):
+        session.info["questions_changed"] = True
+
+
+@event.listens_for(db.session, "after_bulk_update")
+@event.listens_for(db.session, "after_bulk_delete")
+def _note_bulk_question_changes(context):
+    if context.mapper.class_ is Question:
+        context.session.info["questions_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("questions_changed", False):
+        question_bank.invalidate()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("questions_changed", None)
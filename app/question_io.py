@@ -0,0 +1,160 @@
+"""Import and export the question bank as JSON, NDJSON or CSV.
+
+Files are parsed as a stream, one question at a time, and upserted by their
+stable ``key`` in batches of QUESTION_IMPORT_BATCH_SIZE. A whole import runs in
+the caller's transaction, so a bad row leaves the bank untouched. Exports are
+generators of text chunks read with ``yield_per``, ready to write to a file or
+stream as a response.
+"""
+import csv
+import io
+import json
+
+from flask import current_app
+
+from app import db
+from app.models import Question
+from app.seed import upsert_questions
+
+FORMATS = ("json", "ndjson", "csv")
+MIMETYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+FIELDS = ("key",) + Question.CONTENT_FIELDS
+REQUIRED = ("key", "question", "answer_type", "answer")
+CHUNK_SIZE = 64 * 1024
+
+
+def guess_format(name):
+    """The format implied by a file name or mimetype, or None."""
+    name = (name or "").lower()
+    for fmt, mimetype in MIMETYPES.items():
+        if name == mimetype or name.endswith("." + fmt):
+            return fmt
+    return None
+
+
+def iter_json_array(stream):
+    """Yield the items of a top-level JSON array without reading it all at once."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = "", 0, False
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), ""):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("expected a JSON array of questions")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break  # the item continues in the next chunk
+            yield item
+    raise ValueError("the JSON array is incomplete or malformed")
+
+
+def iter_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_questions(stream, fmt):
+    """Parse questions one at a time from a text stream."""
+    if fmt == "json":
+        return iter_json_array(stream)
+    if fmt == "ndjson":
+        return iter_ndjson(stream)
+    if fmt == "csv":
+        return csv.DictReader(stream)
+    raise ValueError(f"unsupported format: {fmt}")
+
+
+def clean(row):
+    if not isinstance(row, dict):
+        raise ValueError("each question must be an object")
+    missing = [field for field in REQUIRED if not row.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    # CSV has no null, so empty cells mean no value
+    values = {field: row.get(field) for field in FIELDS}
+    return {
+        field: None if value in (None, "") else str(value)
+        for field, value in values.items()
+    }
+
+
+def import_questions(rows, batch_size=None):
+    """Upsert parsed questions in batches, returning (created, updated, unchanged).
+
+    Raises ValueError naming the first bad question, malformed CSV and
+    undecodable text included. Nothing is committed.
+    """
+    batch_size = batch_size or current_app.config["QUESTION_IMPORT_BATCH_SIZE"]
+    totals = [0, 0, 0]
+    seen = set()
+    batch = []
+
+    def flush():
+        for index, count in enumerate(upsert_questions(batch)):
+            totals[index] += count
+        db.session.flush()
+        batch.clear()
+
+    # parse errors surface while fetching a row, so count the row in progress
+    number = 1
+    try:
+        for row in rows:
+            row = clean(row)
+            if row["key"] in seen:
+                raise ValueError(f"duplicate key {row['key']!r}")
+            seen.add(row["key"])
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+            number += 1
+    except (ValueError, csv.Error) as e:
+        # UnicodeDecodeError is a ValueError too, raised by the request's text wrapper
+        raise ValueError(f"question {number}: {e}")
+    if batch:
+        flush()
+    return tuple(totals)
+
+
+def export_questions(fmt):
+    """Yield the question bank as text chunks in ``fmt``."""
+    questions = Question.query.order_by(Question.question_id).yield_per(
+        current_app.config["QUESTION_IMPORT_BATCH_SIZE"]
+    )
+    rows = ({field: getattr(q, field) for field in FIELDS} for q in questions)
+    if fmt == "json":
+        yield "["
+        for index, row in enumerate(rows):
+            yield ("," if index else "") + json.dumps(row)
+        yield "]\n"
+    elif fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(row) + "\n"
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
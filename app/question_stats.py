@@ -0,0 +1,71 @@
+"""Per-question difficulty report read from the question_stats tables.
+
+The counters are kept by ``app.rollups`` as attempts are saved, so the report
+costs two small queries however many attempts there are: one for the totals
+and one for the last few days of the trend. The question text and choices come
+from the cached question bank.
+"""
+from datetime import datetime, timedelta
+
+from app.models import QuestionDailyStat, QuestionStat
+from app.question_bank import question_bank
+
+
+def percent(part, whole):
+    return round(100 * part / whole, 1) if whole else None
+
+
+def question_report(days=14):
+    """One dict per question in the bank, with its counts and ``days`` of trend."""
+    bank = question_bank.get()
+    stats = {stat.question_id: stat.to_dict() for stat in QuestionStat.query}
+    today = datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+    daily = {
+        (stat.question_id, stat.day): stat
+        for stat in QuestionDailyStat.query.filter(QuestionDailyStat.day >= since)
+    }
+    empty = dict.fromkeys(QuestionStat.COUNTERS, 0)
+
+    report = []
+    for question in bank.questions:
+        question_id = question["question_id"]
+        counts = stats.get(question_id, empty)
+        choices = [
+            {
+                "choice": question[f"answer_choice_{n}"],
+                "count": counts[f"choice_{n}"],
+                "percent": percent(counts[f"choice_{n}"], counts["answered"]),
+                "correct": question[f"answer_choice_{n}"] == question["answer"],
+            }
+            for n in range(1, 5)
+            if question[f"answer_choice_{n}"]
+        ]
+        trend = []
+        for offset in range(days):
+            day = since + timedelta(days=offset)
+            stat = daily.get((question_id, day))
+            answered, correct = (stat.answered, stat.correct) if stat else (0, 0)
+            trend.append(
+                {
+                    "day": day.isoformat(),
+                    "answered": answered,
+                    "correct": correct,
+                    "percent_correct": percent(correct, answered),
+                }
+            )
+        report.append(
+            {
+                "question_id": question_id,
+                "question": question["question"],
+                "answer_type": question["answer_type"],
+                "answered": counts["answered"],
+                "correct": counts["correct"],
+                "percent_correct": percent(counts["correct"], counts["answered"]),
+                "blank": counts["blank"],
+                "other": counts["other"],
+                "choices": choices,
+                "trend": trend,
+            }
+        )
+    return report
@@ -0,0 +1,320 @@
+"""Counters that summarise the logs and attempts tables.
+
+The counters are bumped from a session ``after_flush`` hook so they are written in
+the same transaction as the rows they count, and the admin pages can read them
+instead of scanning the underlying tables. That covers the daily totals, each
+user's summary (attempt count, best and last score) for the leaderboard, and
+each question's answer counts, in total and per day, for the stat page.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, case, event, literal, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models import (
+    Attempt,
+    AttemptAnswer,
+    DailyStat,
+    Log,
+    QuestionDailyStat,
+    QuestionStat,
+    UserSummary,
+)
+from app.question_bank import question_bank
+
+UPSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+UPSERT_BATCH_SIZE = 500  # rows per multi-row statement
+
+
+def upsert(connection, table, keys, rows, merge):
+    """Insert ``rows``, updating any that exist already as ``merge`` says.
+
+    ``keys`` names the columns that identify a row. ``merge(current, new)`` gets
+    the table's columns and a row's proposed values as column expressions, and
+    returns the {column: expression} to set. The rows must all have the same
+    columns and distinct keys; each batch is one statement where the database
+    has an upsert.
+    """
+    dialect = connection.dialect.name
+    if dialect in UPSERTS or dialect == "mysql":
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start : start + UPSERT_BATCH_SIZE]
+            if dialect == "mysql":
+                stmt = mysql_insert(table).values(batch)
+                # a list keeps the order, which matters to mysql (see merge_summary)
+                stmt = stmt.on_duplicate_key_update(
+                    list(merge(table.c, stmt.inserted).items())
+                )
+            else:
+                stmt = UPSERTS[dialect](table).values(batch)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=keys, set_=merge(table.c, stmt.excluded)
+                )
+            connection.execute(stmt)
+        return
+    for row in rows:
+        new = {
+            name: literal(value, table.c[name].type)
+            for name, value in row.items()
+            if name not in keys
+        }
+        update = (
+            table.update()
+            .where(and_(*[table.c[name] == row[name] for name in keys]))
+            .values(merge(table.c, new))
+        )
+        if not connection.execute(update).rowcount:
+            connection.execute(table.insert().values(**row))
+
+
+def increment(connection, table, keys, rows):
+    """Add each row's counters to the row with the same ``keys``, creating it if needed."""
+    counters = [name for name in rows[0] if name not in keys]
+    upsert(
+        connection,
+        table,
+        keys,
+        rows,
+        lambda current, new: {name: current[name] + new[name] for name in counters},
+    )
+
+
+def add_attempt(summary, score, when):
+    """Fold one attempt into a user summary dict (None for a user's first)."""
+    score = score or 0
+    if summary is None:
+        return {
+            "attempts": 1,
+            "best_score": score,
+            "best_at": when,
+            "last_score": score,
+            "last_attempt": when,
+        }
+    summary["attempts"] += 1
+    if score > summary["best_score"] or (
+        score == summary["best_score"] and when < summary["best_at"]
+    ):
+        summary["best_score"], summary["best_at"] = score, when
+    if when >= summary["last_attempt"]:
+        summary["last_score"], summary["last_attempt"] = score, when
+    return summary
+
+
+def merge_summary(current, new):
+    """Combine a stored user summary with one for newly added attempts."""
+    better = or_(
+        new["best_score"] > current.best_score,
+        and_(new["best_score"] == current.best_score, new["best_at"] < current.best_at),
+    )
+    later = new["last_attempt"] >= current.last_attempt
+    # mysql assigns these in order and later expressions see the values already
+    # assigned; in this order that still matches what the other databases do
+    return {
+        "best_at": case((better, new["best_at"]), else_=current.best_at),
+        "best_score": case((better, new["best_score"]), else_=current.best_score),
+        "last_score": case((later, new["last_score"]), else_=current.last_score),
+        "last_attempt": case((later, new["last_attempt"]), else_=current.last_attempt),
+        "attempts": current.attempts + new["attempts"],
+    }
+
+
+def refresh_summary(connection, user_id):
+    """Recompute one user's summary from their attempts, after some were deleted."""
+    attempts = Attempt.__table__
+    table = UserSummary.__table__
+    summary = None
+    for score, when in connection.execute(
+        select(attempts.c.score, attempts.c.date)
+        .where(attempts.c.user_id == user_id)
+        .order_by(attempts.c.date, attempts.c.attempt_id)
+    ):
+        summary = add_attempt(summary, score, when or datetime.utcnow())
+    connection.execute(table.delete().where(table.c.user_id == user_id))
+    if summary is not None:
+        connection.execute(table.insert().values(user_id=user_id, **summary))
+
+
+def choice_positions(bank):
+    """{question_id: {choice: n}} for the answer_choice_<n> of every question."""
+    return {
+        question["question_id"]: {
+            question[f"answer_choice_{n}"]: n
+            for n in range(1, 5)
+            if question[f"answer_choice_{n}"]
+        }
+        for question in bank.questions
+    }
+
+
+def answer_slot(positions, question_id, answer):
+    """The QuestionStat column that counts ``answer``."""
+    if not answer:
+        return "blank"
+    position = positions.get(question_id, {}).get(answer)
+    return f"choice_{position}" if position else "other"
+
+
+def _day(obj):
+    return (obj.date or datetime.utcnow()).date()
+
+
+@event.listens_for(db.session, "after_flush")
+def update_rollups(session, flush_context):
+    daily = defaultdict(lambda: {"visitors": 0, "attempts": 0})
+    questions = defaultdict(lambda: dict.fromkeys(QuestionStat.COUNTERS, 0))
+    question_days = defaultdict(lambda: {"answered": 0, "correct": 0})
+    changes = [(obj, 1) for obj in session.new] + [(obj, -1) for obj in session.deleted]
+    added, removed = [], set()
+    positions = None
+    for obj, sign in changes:
+        if isinstance(obj, Log):
+            daily[_day(obj)]["visitors"] += sign
+        elif isinstance(obj, Attempt):
+            daily[_day(obj)]["attempts"] += sign
+            if obj.user_id is None:
+                continue
+            if sign > 0:
+                added.append(obj)
+            else:
+                removed.add(obj.user_id)
+        elif isinstance(obj, AttemptAnswer):
+            # marked answers are counted here, whether the quiz form or the api
+            # graded them; the bank is already cached, so this does not query
+            if positions is None:
+                positions = question_bank.get().memo("choice_positions", choice_positions)
+            correct = sign if obj.correct else 0
+            counts = questions[obj.question_id]
+            counts["answered"] += sign
+            counts["correct"] += correct
+            counts[answer_slot(positions, obj.question_id, obj.answer)] += sign
+            attempt = obj.attempt
+            day = _day(attempt) if attempt is not None else datetime.utcnow().date()
+            counts = question_days[(obj.question_id, day)]
+            counts["answered"] += sign
+            counts["correct"] += correct
+    if not daily and not questions:
+        return
+    connection = session.connection()
+    if daily:
+        rows = [dict(deltas, day=day) for day, deltas in daily.items()]
+        increment(connection, DailyStat.__table__, ["day"], rows)
+    if questions:
+        rows = [dict(deltas, question_id=key) for key, deltas in questions.items()]
+        increment(connection, QuestionStat.__table__, ["question_id"], rows)
+        rows = [
+            dict(deltas, question_id=question_id, day=day)
+            for (question_id, day), deltas in question_days.items()
+        ]
+        increment(connection, QuestionDailyStat.__table__, ["question_id", "day"], rows)
+
+    summaries = {}
+    for attempt in sorted(added, key=lambda attempt: attempt.attempt_id):
+        summaries[attempt.user_id] = add_attempt(
+            summaries.get(attempt.user_id),
+            attempt.score,
+            attempt.date or datetime.utcnow(),
+        )
+    rows = [
+        dict(summary, user_id=user_id)
+        for user_id, summary in summaries.items()
+        if user_id not in removed
+    ]
+    if rows:
+        upsert(connection, UserSummary.__table__, ["user_id"], rows, merge_summary)
+    # a best score cannot be taken back by a counter, so those users are recounted
+    for user_id in removed:
+        refresh_summary(connection, user_id)
+
+
+def _as_date(value):
+    # SQLite hands back DATE() results as strings
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def rebuild_daily_stats():
+    """Recompute every DailyStat row from the logs and attempts tables."""
+    counts = defaultdict(dict)
+    for model, column in ((Log, "visitors"), (Attempt, "attempts")):
+        day = db.func.date(model.date)
+        for value, count in db.session.query(day, db.func.count()).group_by(day):
+            counts[_as_date(value)][column] = count
+    DailyStat.query.delete()
+    db.session.add_all(DailyStat(day=day, **columns) for day, columns in counts.items())
+    db.session.commit()
+    return len(counts)
+
+
+def rebuild_user_summaries(batch_size=1000):
+    """Recompute every UserSummary row from the attempts table."""
+    attempts = Attempt.__table__
+    query = (
+        select(attempts.c.user_id, attempts.c.score, attempts.c.date)
+        .where(attempts.c.user_id.isnot(None))
+        .order_by(attempts.c.user_id, attempts.c.date, attempts.c.attempt_id)
+    )
+    summaries = {}
+    for user_id, score, when in db.session.execute(query):
+        summaries[user_id] = add_attempt(
+            summaries.get(user_id), score, when or datetime.utcnow()
+        )
+    UserSummary.query.delete()
+    rows = [dict(summary, user_id=user_id) for user_id, summary in summaries.items()]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(UserSummary.__table__.insert(), rows[start : start + batch_size])
+    db.session.commit()
+    return len(rows)
+
+
+def rebuild_question_stats():
+    """Recompute the per-question counters from the attempt answers."""
+    positions = choice_positions(question_bank.get())
+    totals = defaultdict(lambda: dict.fromkeys(QuestionStat.COUNTERS, 0))
+    answers = db.session.query(
+        AttemptAnswer.question_id,
+        AttemptAnswer.answer,
+        AttemptAnswer.correct,
+        db.func.count(),
+    ).group_by(AttemptAnswer.question_id, AttemptAnswer.answer, AttemptAnswer.correct)
+    for question_id, answer, correct, count in answers:
+        counts = totals[question_id]
+        counts["answered"] += count
+        counts["correct"] += count if correct else 0
+        counts[answer_slot(positions, question_id, answer)] += count
+
+    day = db.func.date(Attempt.date)
+    daily = (
+        db.session.query(
+            AttemptAnswer.question_id,
+            day,
+            db.func.count(),
+            db.func.sum(case((AttemptAnswer.correct, 1), else_=0)),
+        )
+        .join(Attempt)
+        .filter(Attempt.date.isnot(None))
+        .group_by(AttemptAnswer.question_id, day)
+    )
+    days = [
+        {
+            "question_id": question_id,
+            "day": _as_date(value),
+            "answered": answered,
+            "correct": correct,
+        }
+        for question_id, value, answered, correct in daily
+    ]
+    QuestionStat.query.delete()
+    QuestionDailyStat.query.delete()
+    rows = [dict(counts, question_id=key) for key, counts in totals.items()]
+    for table, values in ((QuestionStat, rows), (QuestionDailyStat, days)):
+        for start in range(0, len(values), UPSERT_BATCH_SIZE):
+            db.session.execute(
+                table.__table__.insert(), values[start : start + UPSERT_BATCH_SIZE]
+            )
+    db.session.commit()
+    return len(rows)
@@ -1,68 +1,88 @@
-from flask import render_template, flash, redirect, url_for
-from app import app, db
+from flask import Blueprint, render_template, flash, redirect, url_for
+from app import db
 from flask_login import current_user, login_user, logout_user, login_required
 from app.controllers import (
     UserController,
     LogController,
     AttemptController,
     ReviewController,
+    LeaderboardController,
 )
 
 from flask import request
 from werkzeug.urls import url_parse
+from app.conditional import conditional, user_stamp, attempts_stamp
 
 
-@app.route("/favicon.ico")
+def review_stamp():
+    if current_user.is_anonymous:
+        return user_stamp()
+    return user_stamp() + attempts_stamp(current_user.id)
+
+bp = Blueprint("main", __name__)
+
+
+@bp.route("/favicon.ico")
 def favicon():
     return redirect(url_for("static", filename="favicon.ico"), code=302)
 
 
-@app.route("/")
-@app.route("/index")
+@bp.route("/")
+@bp.route("/index")
+@conditional(user_stamp)
 def index():
     # if not current_user.is_authenticated:
     #     return render_template("index.html", projects=[])
     return render_template("index.html", title="PC Wiki")
 
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if not current_user.is_authenticated:
         return UserController.login()
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     return UserController.logout()
 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     return UserController.register()
 
 
-@app.route("/learn")
+@bp.route("/learn")
+@conditional(user_stamp)
 def learn():
     return render_template("content.html", title="Learning")
 
 
-@app.route("/review")
+@bp.route("/review")
+@conditional(review_stamp)
 def review():
     if current_user.is_anonymous:
         return render_template("review.html", title="Review")
     return ReviewController.get_User_Results()
 
 
-@app.route("/quiz", methods=["GET", "POST"])
+@bp.route("/leaderboard")
+def leaderboard():
+    if current_user.is_anonymous:
+        return render_template("leaderboard.html", title="Leaderboard")
+    return LeaderboardController.leaderboard()
+
+
+@bp.route("/quiz", methods=["GET", "POST"])
 def quiz():
     if current_user.is_anonymous:
         return render_template("quiz.html", title="Quiz")
     return AttemptController.quiz()
 
 
-@app.route("/stat", methods=["GET", "POST"])
+@bp.route("/stat", methods=["GET", "POST"])
 def stat():
     if current_user.is_anonymous:
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
     return LogController.stats()
\ No newline at end of file
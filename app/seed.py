@@ -0,0 +1,131 @@
+"""Bootstrap data: the admin account and the quiz question bank.
+
+Run once per deploy with ``flask seed``. Seeding is idempotent: questions are
+matched on their stable ``key`` (or, for rows created before keys existed, on
+the question text) and only rewritten when their content hash differs.
+"""
+import os
+
+from app import db
+from app.models import User, Question
+
+ADMIN = {"id": "UWAadmin", "first_name": "UWA", "surname": "admin"}
+
+QUESTIONS = [
+    {
+        "key": "cpu-cooling",
+        "question": "Which component needs a fan or many fans to cool down?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "M.2 Solid State Drive",
+        "answer_choice_2": "Random Access Memory",
+        "answer_choice_3": "Central Processing Unit",
+        "answer_choice_4": "I/O Shield",
+        "answer": "Central Processing Unit",
+    },
+    {
+        "key": "first-assembly-step",
+        "question": "Which of the following is the first step of assembling a PC?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "Installing a CPU to a motherboard",
+        "answer_choice_2": "Installing a motherboard to a PC case",
+        "answer_choice_3": "Connecting power and SATA cables to various components",
+        "answer_choice_4": "Applying thermal paste onto the CPU",
+        "answer": "Installing a CPU to a motherboard",
+    },
+    {
+        "key": "ram-slots",
+        "question": "In figure 1, which slots should the RAMs be installed in?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "8",
+        "answer_choice_2": "5",
+        "answer_choice_3": "7",
+        "answer_choice_4": "4",
+        "answer": "8",
+    },
+    {
+        "key": "gpu-slots",
+        "question": "In figure 1, which slots should the GPUs be installed in?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "6",
+        "answer_choice_2": "3",
+        "answer_choice_3": "7",
+        "answer_choice_4": "5",
+        "answer": "7",
+    },
+    {
+        "key": "figure-1-item-3",
+        "question": "In figure 1, what is 3?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "6-pin connectors",
+        "answer_choice_2": "HDMI",
+        "answer_choice_3": "Bluetooth",
+        "answer_choice_4": "SATA connectors",
+        "answer": "SATA connectors",
+    },
+    {
+        "key": "stock-cooler-paste",
+        "question": "Do you need to apply thermal paste if you are using stock cooler for your CPU?",
+        "answer_type": "MCQ",
+        "answer_choice_1": "Yes",
+        "answer_choice_2": "No",
+        "answer_choice_3": "I don't know",
+        "answer_choice_4": "I do not need a cooler for my CPU",
+        "answer": "No",
+    },
+    {
+        "key": "motherboard",
+        "question": "A ___________ is a main printed circuit board that allows communications between different electronic components",
+        "answer_type": "SAQ",
+        "answer": "motherboard",
+    },
+]
+
+
+def upsert_questions(rows):
+    """Insert or update questions by key, returning (created, updated, unchanged)."""
+    rows = list(rows)
+    keys = [row["key"] for row in rows]
+    existing = {q.key: q for q in Question.query.filter(Question.key.in_(keys))}
+    # rows seeded before questions had keys are matched on their text instead
+    unkeyed = {
+        q.question: q
+        for q in Question.query.filter(
+            Question.key.is_(None),
+            Question.question.in_([row["question"] for row in rows]),
+        )
+    }
+    created = updated = unchanged = 0
+    for row in rows:
+        question = existing.get(row["key"]) or unkeyed.pop(row["question"], None)
+        if question is None:
+            question = Question()
+            db.session.add(question)
+            created += 1
+        elif question.key == row["key"] and (
+            question.content_hash() == Question.hash_content(row)
+        ):
+            unchanged += 1
+            continue
+        else:
+            updated += 1
+        question.from_dict(
+            {field: row.get(field) for field in ("key",) + Question.CONTENT_FIELDS}
+        )
+    return created, updated, unchanged
+
+
+def seed_admin():
+    if User.query.get(ADMIN["id"]) is not None:
+        return False
+    admin = User(isAdmin=True, **ADMIN)
+    admin.set_password(os.environ.get("ADMIN_PASSWORD") or "UWAadmin")
+    db.session.add(admin)
+    return True
+
+
+def seed():
+    """Create the admin user and question bank if missing; safe to run repeatedly."""
+    admin_created = seed_admin()
+    counts = upsert_questions(QUESTIONS)
+    db.session.commit()
+    return admin_created, counts
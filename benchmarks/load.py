@@ -0,0 +1,390 @@
+"""Route-level load test: latency percentiles and throughput for every page and API route.
+
+    python -m benchmarks.load [--target client|http://127.0.0.1:8000] [--concurrency 8]
+                              [--requests 200] [--route "GET /quiz"] [--config production]
+                              [--baseline previous.json]
+
+Every worker thread logs in as its own synthetic user (bench_0, bench_1, ...), so
+run "flask seed" and "python -m benchmarks.seed" first. Admin-only routes use
+--admin/--admin-password. "client" drives the app in-process with one Flask test
+client per thread; a URL drives a running server such as gunicorn. Forms are
+filled from the rendered pages, CSRF token included. Only the request itself is
+timed: setup steps such as fetching a fresh token before DELETE /api/tokens are
+not, although they do count against that route's requests per second. Results
+are printed as JSON; --baseline adds the change against an earlier run's output.
+"""
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import (
+    HTTPCookieProcessor,
+    HTTPRedirectHandler,
+    Request,
+    build_opener,
+)
+
+
+class FormParser(HTMLParser):
+    """Collect the <input> fields of every form on a page, keyed by form action."""
+
+    def __init__(self):
+        super().__init__()
+        self.forms = {}
+        self._fields = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._fields = self.forms.setdefault(attrs.get("action"), [])
+        elif tag == "input" and self._fields is not None and attrs.get("name"):
+            self._fields.append(attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._fields = None
+
+
+def form_data(html, action, **values):
+    """Fill the form posting to ``action``: hidden fields keep their value, each
+    radio group takes its first choice and text boxes default to "motherboard"."""
+    parser = FormParser()
+    parser.feed(html)
+    data = {}
+    for field in parser.forms.get(action, []):
+        name, kind = field["name"], field.get("type", "text")
+        if name in data or kind in ("checkbox", "submit"):
+            continue
+        if kind in ("hidden", "radio"):
+            data[name] = field.get("value", "")
+        elif kind == "text":
+            data[name] = "motherboard"
+    data.update(values)
+    return data
+
+
+def basic_auth(username, password):
+    credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return {"Authorization": f"Basic {credentials}"}
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+class ClientTarget(object):
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None, headers=None):
+        response = self.client.open(
+            path, method=method, data=data, json=json_body, headers=headers
+        )
+        return response.status_code, response.get_data(as_text=True)
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # report redirects as they are, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTarget(object):
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None, json_body=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request = Request(self.base_url + path, body, headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read().decode()
+        except HTTPError as error:
+            return error.code, error.read().decode()
+
+
+class Session(object):
+    """A logged-in browser session plus an API token for one user."""
+
+    def __init__(self, target, username, password):
+        self.target = target
+        self.username = username
+        self.password = password
+        _, html = target.request("GET", "/login")
+        data = form_data(
+            html, "/login", **{"l-username": username, "l-password": password}
+        )
+        status, _ = target.request("POST", "/login", data=data)
+        if status != 302:
+            raise RuntimeError(f"could not log in as {username} (HTTP {status})")
+        self.refresh_token()
+        _, html = target.request("GET", "/quiz")
+        self.quiz = form_data(html, "/quiz")
+        _, bank = target.request("GET", "/api/quiz/", headers=bearer(self.token))
+        self.answers = {
+            question_id: question["answer"]
+            for question_id, question in json.loads(bank).items()
+        }
+
+    def refresh_token(self):
+        _, body = self.target.request(
+            "POST", "/api/tokens", headers=basic_auth(self.username, self.password)
+        )
+        self.token = json.loads(body)["token"]
+
+
+class Worker(object):
+    def __init__(self, make_target, username, password, admin, admin_password):
+        self.make_target = make_target
+        self.user = Session(make_target(), username, password)
+        self.admin = Session(make_target(), admin, admin_password)
+        self.anonymous = make_target()
+
+
+# Each scenario maps a worker to (session target, method, path, request kwargs).
+# PREPARE and FINISH steps run untimed around every request of their scenario.
+
+
+def login_prepare(worker):
+    worker.anonymous.request("GET", "/logout")
+    _, html = worker.anonymous.request("GET", "/login")
+    worker.login_form = form_data(
+        html,
+        "/login",
+        **{"l-username": worker.user.username, "l-password": worker.user.password},
+    )
+
+
+def new_token(worker):
+    worker.user.refresh_token()
+
+
+SCENARIOS = {
+    "GET /": lambda w: (w.anonymous, "GET", "/", {}),
+    "GET /login": lambda w: (w.anonymous, "GET", "/login", {}),
+    "POST /login": lambda w: (
+        w.anonymous,
+        "POST",
+        "/login",
+        {"data": w.login_form},
+    ),
+    "GET /quiz": lambda w: (w.user.target, "GET", "/quiz", {}),
+    "POST /quiz": lambda w: (w.user.target, "POST", "/quiz", {"data": w.user.quiz}),
+    "GET /review": lambda w: (w.user.target, "GET", "/review", {}),
+    "GET /stat": lambda w: (w.admin.target, "GET", "/stat", {}),
+    "GET /leaderboard": lambda w: (w.user.target, "GET", "/leaderboard", {}),
+    "GET /api/quiz/": lambda w: (
+        w.user.target,
+        "GET",
+        "/api/quiz/",
+        {"headers": bearer(w.user.token)},
+    ),
+    "GET /api/attempts/": lambda w: (
+        w.admin.target,
+        "GET",
+        "/api/attempts/",
+        {"headers": bearer(w.admin.token)},
+    ),
+    "GET /api/leaderboard": lambda w: (
+        w.user.target,
+        "GET",
+        "/api/leaderboard",
+        {"headers": bearer(w.user.token)},
+    ),
+    "GET /api/questions/stats": lambda w: (
+        w.admin.target,
+        "GET",
+        "/api/questions/stats",
+        {"headers": bearer(w.admin.token)},
+    ),
+    "POST /api/tokens": lambda w: (
+        w.user.target,
+        "POST",
+        "/api/tokens",
+        {"headers": basic_auth(w.user.username, w.user.password)},
+    ),
+    "DELETE /api/tokens": lambda w: (
+        w.user.target,
+        "DELETE",
+        "/api/tokens",
+        {"headers": bearer(w.user.token)},
+    ),
+    # an already registered user, so this times the rejection path
+    "POST /api/users": lambda w: (
+        w.user.target,
+        "POST",
+        "/api/users",
+        {"json_body": {"id": w.user.username, "password_hash": w.user.password}},
+    ),
+    "GET /api/users/<id>": lambda w: (
+        w.user.target,
+        "GET",
+        f"/api/users/{w.user.username}",
+        {"headers": bearer(w.user.token)},
+    ),
+    "GET /api/users/<id>/summary": lambda w: (
+        w.user.target,
+        "GET",
+        f"/api/users/{w.user.username}/summary",
+        {"headers": bearer(w.user.token)},
+    ),
+    "GET /api/users/<id>/attempts": lambda w: (
+        w.user.target,
+        "GET",
+        f"/api/users/{w.user.username}/attempts",
+        {"headers": bearer(w.user.token)},
+    ),
+    "POST /api/users/<id>/attempts": lambda w: (
+        w.user.target,
+        "POST",
+        f"/api/users/{w.user.username}/attempts",
+        {"headers": bearer(w.user.token), "json_body": {"answers": w.user.answers}},
+    ),
+    "POST /api/users/<id>/attempts/batch": lambda w: (
+        w.user.target,
+        "POST",
+        f"/api/users/{w.user.username}/attempts/batch",
+        {
+            "headers": bearer(w.user.token),
+            "json_body": [{"answers": w.user.answers}] * 100,
+        },
+    ),
+}
+
+PREPARE = {"POST /login": login_prepare, "DELETE /api/tokens": new_token}
+# the other scenarios still need a live token once the revoke has been timed
+FINISH = {"DELETE /api/tokens": new_token}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summarise(timings, statuses, elapsed):
+    timings = sorted(timings)
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "status": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": round(len(timings) / elapsed, 2),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+def compare(result, baseline):
+    for name, route in result["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        route["baseline"] = {
+            "p95_ms": before["p95_ms"],
+            "rps": before["rps"],
+            "p95_change": round(route["p95_ms"] / before["p95_ms"] - 1, 3),
+            "rps_change": round(route["rps"] / before["rps"] - 1, 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="client")
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--route", dest="routes", action="append", choices=SCENARIOS)
+    parser.add_argument("--user-prefix", default="bench_")
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--admin", default="UWAadmin")
+    parser.add_argument(
+        "--admin-password", default=os.environ.get("ADMIN_PASSWORD", "UWAadmin")
+    )
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    if args.target == "client":
+        from app import create_app
+        from config import get_config
+
+        app = create_app(get_config(args.config))
+        make_target = lambda: ClientTarget(app)
+    else:
+        make_target = lambda: HTTPTarget(args.target)
+
+    local = threading.local()
+    slots = iter(range(args.concurrency))
+    slots_lock = threading.Lock()
+    ready = threading.Barrier(args.concurrency)
+
+    def start_worker():
+        with slots_lock:
+            slot = next(slots)
+        local.worker = Worker(
+            make_target,
+            f"{args.user_prefix}{slot}",
+            args.password,
+            args.admin,
+            args.admin_password,
+        )
+
+    def warm_up(_):
+        # hold every thread until all of them exist and have logged in
+        ready.wait()
+
+    def hit(name):
+        worker = local.worker
+        if name in PREPARE:
+            PREPARE[name](worker)
+        target, method, path, kwargs = SCENARIOS[name](worker)
+        start = time.perf_counter()
+        status, _ = target.request(method, path, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        if name in FINISH:
+            FINISH[name](worker)
+        return elapsed, status
+
+    result = {
+        "benchmark": "load",
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "routes": {},
+    }
+    with ThreadPoolExecutor(args.concurrency, initializer=start_worker) as pool:
+        list(pool.map(warm_up, range(args.concurrency)))
+        for name in args.routes or SCENARIOS:
+            start = time.perf_counter()
+            samples = list(pool.map(hit, [name] * args.requests))
+            elapsed = time.perf_counter() - start
+            statuses = Counter(status for _, status in samples)
+            timings = [timing for timing, _ in samples]
+            result["routes"][name] = summarise(timings, statuses, elapsed)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(result, json.load(baseline))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
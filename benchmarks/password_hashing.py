@@ -0,0 +1,81 @@
+"""Logins per second per core for the configured password hashing policy.
+
+    python -m benchmarks.password_hashing [--seconds 5] [--method pbkdf2:sha256:150000]
+                                          [--clients N] [--max-concurrency N]
+
+Each "login" is one check_password call against a stored hash, which is the CPU
+bound part of /login, /register and HTTP Basic /api/tokens. Results are printed
+as JSON.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from app.passwords import PasswordHasher
+
+
+def run(hasher, seconds, clients):
+    pwhash = hasher.hash("benchmark-password")
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        logins = 0
+        while time.perf_counter() < deadline:
+            hasher.check(pwhash, "benchmark-password")
+            logins += 1
+        return logins
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        logins = sum(pool.map(lambda _: client(), range(clients)))
+    return logins, time.perf_counter() - start
+
+
+def main():
+    app = create_app()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--method", default=app.config["PASSWORD_HASH_METHOD"])
+    parser.add_argument("--salt-length", type=int, default=app.config["PASSWORD_SALT_LENGTH"])
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=app.config["PASSWORD_HASH_MAX_CONCURRENCY"],
+    )
+    args = parser.parse_args()
+
+    app.config.update(
+        PASSWORD_HASH_METHOD=args.method,
+        PASSWORD_SALT_LENGTH=args.salt_length,
+        PASSWORD_HASH_MAX_CONCURRENCY=args.max_concurrency,
+    )
+    hasher = PasswordHasher(app)
+    clients = max(args.clients, 1)
+    logins, elapsed = run(hasher, args.seconds, clients)
+    busy = min(clients, args.max_concurrency) if args.max_concurrency else clients
+    cores = min(busy, os.cpu_count() or 1)
+    print(
+        json.dumps(
+            {
+                "benchmark": "password_hashing",
+                "method": hasher.method,
+                "salt_length": hasher.salt_length,
+                "clients": clients,
+                "max_concurrency": args.max_concurrency,
+                "cores": cores,
+                "seconds": round(elapsed, 3),
+                "logins": logins,
+                "logins_per_second": round(logins / elapsed, 2),
+                "logins_per_second_per_core": round(logins / elapsed / cores, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
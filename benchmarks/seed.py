@@ -0,0 +1,170 @@
+"""Fill the database with synthetic users, questions, attempts and visitor logs.
+
+    python -m benchmarks.seed [--users 1000] [--attempts 100000] [--logs 100000]
+                              [--questions 0] [--days 30] [--batch 10000]
+
+Rows are written with Core executemany inserts in batches, so millions of rows
+load in bounded memory. Every synthetic user is called bench_<n> and shares the
+password "benchmark". Attempts and logs are spread over the last --days days,
+and the rollup tables are rebuilt once at the end. Run "flask seed" first so the
+real question bank and admin account exist.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db, password_hasher
+from app.models import Attempt, AttemptAnswer, Log, Question, User
+from app.rollups import (
+    rebuild_daily_stats,
+    rebuild_question_stats,
+    rebuild_user_summaries,
+)
+
+PASSWORD = "benchmark"
+
+
+def chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(table, rows, batch):
+    count = 0
+    for chunk in chunks(rows, batch):
+        db.session.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def random_date(days):
+    return datetime.utcnow() - timedelta(seconds=random.uniform(0, days * 86400))
+
+
+def next_id(column):
+    return (db.session.query(db.func.max(column)).scalar() or 0) + 1
+
+
+def seed_users(count, batch):
+    # numbering carries on from earlier runs: bench_0, bench_1, ...
+    start = User.query.filter(User.id.startswith("bench_")).count()
+    # one hash shared by every synthetic user keeps seeding fast
+    pwhash = password_hasher.hash(PASSWORD)
+    rows = (
+        {
+            "id": f"bench_{start + n}",
+            "first_name": "Bench",
+            "surname": str(start + n),
+            "password_hash": pwhash,
+            "isAdmin": False,
+            "date": datetime.utcnow(),
+        }
+        for n in range(count)
+    )
+    return insert(User.__table__, rows, batch)
+
+
+def seed_questions(count, batch):
+    start = next_id(Question.question_id)
+    rows = (
+        {
+            "key": f"bench-{start + n}",
+            "question": f"Benchmark question {start + n}?",
+            "answer_type": "MCQ",
+            "answer_choice_1": "A",
+            "answer_choice_2": "B",
+            "answer_choice_3": "C",
+            "answer_choice_4": "D",
+            "answer": random.choice("ABCD"),
+            "date": datetime.utcnow(),
+        }
+        for n in range(count)
+    )
+    return insert(Question.__table__, rows, batch)
+
+
+def seed_attempts(count, users, questions, days, batch):
+    first = next_id(Attempt.attempt_id)
+    attempts = answers = 0
+    for chunk in chunks(range(first, first + count), batch):
+        attempt_rows, answer_rows = [], []
+        for attempt_id in chunk:
+            score = 0
+            for question in questions:
+                if random.random() < 0.6:
+                    choice = question.answer
+                else:
+                    choice = random.choice("ABCD")
+                correct = choice == question.answer
+                score += correct
+                answer_rows.append(
+                    {
+                        "attempt_id": attempt_id,
+                        "question_id": question.question_id,
+                        "answer": choice,
+                        "correct": correct,
+                    }
+                )
+            attempt_rows.append(
+                {
+                    "attempt_id": attempt_id,
+                    "user_id": random.choice(users),
+                    "date": random_date(days),
+                    "score": score,
+                }
+            )
+        attempts += insert(Attempt.__table__, attempt_rows, batch)
+        answers += insert(AttemptAnswer.__table__, answer_rows, batch)
+    return attempts, answers
+
+
+def seed_logs(count, users, days, batch):
+    rows = (
+        {"user_id": random.choice(users), "date": random_date(days)} for _ in range(count)
+    )
+    return insert(Log.__table__, rows, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--attempts", type=int, default=100000)
+    parser.add_argument("--logs", type=int, default=100000)
+    parser.add_argument("--questions", type=int, default=0)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--random-seed", type=int, default=3403)
+    args = parser.parse_args()
+    random.seed(args.random_seed)
+
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        result = {"benchmark": "seed"}
+        result["users"] = seed_users(args.users, args.batch)
+        result["questions"] = seed_questions(args.questions, args.batch)
+        db.session.commit()
+        users = [user_id for (user_id,) in db.session.query(User.id)]
+        questions = Question.query.order_by(Question.question_id).all()
+        result["attempts"], result["attempt_answers"] = seed_attempts(
+            args.attempts, users, questions, args.days, args.batch
+        )
+        result["logs"] = seed_logs(args.logs, users, args.days, args.batch)
+        db.session.commit()
+        result["rollup_days"] = rebuild_daily_stats()
+        result["user_summaries"] = rebuild_user_summaries()
+        result["question_stats"] = rebuild_question_stats()
+        result["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Cold start time: importing the app, building it and serving the first request.
+
+    python -m benchmarks.startup [--runs 10] [--config production] [--lazy-api]
+                                 [--path /] [--path /api/quiz/]
+
+Every run happens in a fresh interpreter, like a newly spawned gunicorn worker.
+The median and worst timings of each phase are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+from config import get_config
+imported = time.perf_counter()
+app = create_app(get_config(sys.argv[1]))
+created = time.perf_counter()
+client = app.test_client()
+timings = {"import": imported - start, "create_app": created - imported}
+for path in sys.argv[2:]:
+    begin = time.perf_counter()
+    status = client.get(path).status_code
+    timings["first " + path] = time.perf_counter() - begin
+    timings["status " + path] = status
+timings["total"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def probe(config, paths, lazy_api):
+    env = dict(os.environ, LAZY_API="1" if lazy_api else "")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, config] + paths,
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--lazy-api", action="store_true")
+    parser.add_argument("--path", dest="paths", action="append")
+    args = parser.parse_args()
+    paths = args.paths or ["/"]
+
+    runs = [probe(args.config, paths, args.lazy_api) for _ in range(args.runs)]
+    phases = [key for key in runs[0] if not key.startswith("status ")]
+    result = {
+        "benchmark": "startup",
+        "config": args.config,
+        "lazy_api": args.lazy_api,
+        "runs": args.runs,
+        "status": {path: runs[-1]["status " + path] for path in paths},
+    }
+    for phase in phases:
+        values = [run[phase] * 1000 for run in runs]
+        result[phase] = {
+            "median_ms": round(statistics.median(values), 2),
+            "max_ms": round(max(values), 2),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,25 +5,156 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # load_dotenv(os.path.join(basedir, ".env"))
 
 
+def database_url(default):
+    url = os.environ.get("DATABASE_URL") or default
+    # Heroku still hands out postgres:// urls, which SQLAlchemy 1.4 rejects
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def engine_options(url):
+    # sqlite gets its own connection tuning (see SQLITE_* below) instead of a pool
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.environ.get("DATABASE_POOL_SIZE") or 5),
+        "max_overflow": int(os.environ.get("DATABASE_MAX_OVERFLOW") or 10),
+        "pool_recycle": int(os.environ.get("DATABASE_POOL_RECYCLE") or 1800),
+        "pool_pre_ping": True,
+    }
+
+
 class Config(object):
     SECRET_KEY = os.environ.get("SECRET_KEY") or "sshh!"
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(basedir, "app.db")
-    # os.environ.get("DATABASE_URL") or
+    SQLALCHEMY_DATABASE_URI = database_url("sqlite:///" + os.path.join(basedir, "app.db"))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # WAL lets readers carry on while a worker writes; NORMAL only fsyncs at checkpoints
+    SQLITE_JOURNAL_MODE = "WAL"
+    SQLITE_SYNCHRONOUS = "NORMAL"
+    SQLITE_BUSY_TIMEOUT = 5000  # milliseconds to wait on a locked database
+    # seconds before a worker reloads the question bank. A commit in the same
+    # worker drops it at once; the ttl is how long other workers (and other
+    # processes, such as flask seed) take to reach them
+    QUESTION_BANK_TTL = 30
+    REVIEW_PAGE_SIZE = 20
+    LEADERBOARD_PAGE_SIZE = 20
+    QUESTION_TREND_DAYS = 14  # days of per-question trend on the stat page
+    QUESTION_TREND_MAX_DAYS = 90
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 1000
+    API_STREAM_BATCH_SIZE = 500
+    API_BATCH_MAX_SIZE = 1000  # attempts accepted by one /attempts/batch request
+    QUESTION_IMPORT_BATCH_SIZE = 500  # questions upserted per flush on import/export
+    # token -> (user id, expiry) lookups; use a redis:// url to share them between
+    # workers. The user row itself comes from USER_CACHE
+    TOKEN_CACHE_URL = os.environ.get("TOKEN_CACHE_URL") or "memory://"
+    TOKEN_CACHE_SIZE = 10000
+    TOKEN_CACHE_TTL = 300
+    # "db" stores a random token on the user row; "signed" issues tokens that are
+    # verified by signature and the cached user's token generation. Either way a
+    # revoked token keeps working on other workers for up to USER_CACHE_TTL
+    # seconds, unless USER_CACHE_URL is a shared redis
+    TOKEN_MODE = os.environ.get("TOKEN_MODE") or "db"
+    # user rows for the flask-login user_loader; other workers see changes after the ttl
+    USER_CACHE_URL = os.environ.get("USER_CACHE_URL") or "memory://"
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 30
+    # hashes made with another method or salt length are replaced on login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD") or "pbkdf2:sha256:150000"
+    PASSWORD_SALT_LENGTH = 8
+    # hashes running at once per worker process; 0 leaves them unlimited
+    PASSWORD_HASH_MAX_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_MAX_CONCURRENCY") or 0)
+    # None lets jinja pick a private directory under the system temp dir
+    JINJA_BYTECODE_CACHE = True
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get("JINJA_BYTECODE_CACHE_DIR")
+    # import each API module on the first request that needs it
+    LAZY_API = bool(os.environ.get("LAZY_API"))
+    # mixed into every ETag so a release invalidates them; None derives it from
+    # the templates' modification times
+    ETAG_SALT = os.environ.get("ETAG_SALT")
+    # count the queries each request runs and log statements repeated this many
+    # times (a likely N+1); 0 turns the warning off
+    QUERY_STATS = True
+    QUERY_REPEAT_THRESHOLD = 5
+    # send the per-request query count and time as a Server-Timing header
+    QUERY_STATS_HEADER = False
+    # per-worker totals are written here so /metrics can add up every gunicorn
+    # worker; None reports only the worker that answers the scrape
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = 5  # seconds
+    # turn off behind a reverse proxy on the same host, where every client is local
+    METRICS_ALLOW_LOCALHOST = True
+    # output of flask assets build; when it holds a manifest, static urls are
+    # fingerprinted and served with immutable caching
+    ASSETS_DIR = os.environ.get("ASSETS_DIR") or os.path.join(basedir, "dist")
+    ASSETS_IMAGE_WIDTHS = (640, 1280, 1920, 2560)  # responsive photo copies, in pixels
+    ASSETS_IMAGE_QUALITY = 80
+    # gzip (or brotli, when installed) text responses of at least COMPRESS_MIN_SIZE
+    # bytes; turn off when a reverse proxy already compresses
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6  # gzip, 1-9
+    COMPRESS_BROTLI_QUALITY = 4  # 0-11
+    COMPRESS_MIMETYPES = (
+        "text/html",
+        "text/css",
+        "text/csv",
+        "text/plain",
+        "application/javascript",
+        "application/json",
+        "application/x-ndjson",
+        "image/svg+xml",
+    )
+    COMPRESS_STREAM_FLUSH_SIZE = 16 * 1024  # uncompressed bytes between flushes
+    # compressed bodies of responses with an ETag, keyed by the ETag and encoding
+    COMPRESS_CACHE_URL = os.environ.get("COMPRESS_CACHE_URL") or "memory://"
+    COMPRESS_CACHE_SIZE = 512
+    COMPRESS_CACHE_TTL = 3600
+    # visitor logs are queued and inserted in batches by a background thread every
+    # LOG_BUFFER_INTERVAL seconds, or once LOG_BUFFER_SIZE are waiting; "sync"
+    # commits each one in the request instead
+    LOG_BUFFER_MODE = os.environ.get("LOG_BUFFER_MODE") or "async"
+    LOG_BUFFER_SIZE = 100
+    LOG_BUFFER_INTERVAL = 2.0  # seconds
+    LOG_BUFFER_MAX_PENDING = 10000  # kept for retry while the database is down
 
 
 class ProductionConfig(Config):
     ENV = "production"
-    # SECRET_KEY = os.environ["SECRET_KEY"]
-    # SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URL"]
+    DEBUG = False
 
 
 class DevelopmentConfig(Config):
     FLASK_ENV = "development"
     DEBUG = True
+    QUERY_STATS_HEADER = True
 
 
 class TestingConfig(Config):
     ENV = "testing"
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    JINJA_BYTECODE_CACHE = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(basedir, "tests/test.db")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    ASSETS_DIR = None  # tests build their own
+    LOG_BUFFER_MODE = "sync"
     # SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:' #in memory database
+
+
+config = {
+    "production": ProductionConfig,
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "default": Config,
+}
+
+
+def get_config(name=None):
+    """Pick a config class from FLASK_CONFIG (or FLASK_ENV), falling back to Config."""
+    name = name or os.environ.get("FLASK_CONFIG") or os.environ.get("FLASK_ENV")
+    return config.get(name, Config)
+
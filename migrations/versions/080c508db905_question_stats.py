@@ -0,0 +1,150 @@
+"""question stats
+
+Revision ID: 080c508db905
+Revises: 508b0dbcd7dc
+Create Date: 2026-10-18 10:26:26.772117
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '080c508db905'
+down_revision = '508b0dbcd7dc'
+branch_labels = None
+depends_on = None
+
+questions = sa.table(
+    'questions',
+    sa.column('question_id', sa.Integer),
+    sa.column('answer_choice_1', sa.String),
+    sa.column('answer_choice_2', sa.String),
+    sa.column('answer_choice_3', sa.String),
+    sa.column('answer_choice_4', sa.String),
+)
+attempts = sa.table(
+    'attempts',
+    sa.column('attempt_id', sa.Integer),
+    sa.column('date', sa.DateTime),
+)
+attempt_answers = sa.table(
+    'attempt_answers',
+    sa.column('attempt_id', sa.Integer),
+    sa.column('question_id', sa.Integer),
+    sa.column('answer', sa.String),
+    sa.column('correct', sa.Boolean),
+)
+question_stats = sa.table(
+    'question_stats',
+    *(sa.column(name, sa.Integer) for name in (
+        'question_id', 'answered', 'correct', 'blank',
+        'choice_1', 'choice_2', 'choice_3', 'choice_4', 'other',
+    ))
+)
+question_daily_stats = sa.table(
+    'question_daily_stats',
+    sa.column('question_id', sa.Integer),
+    sa.column('day', sa.Date),
+    sa.column('answered', sa.Integer),
+    sa.column('correct', sa.Integer),
+)
+
+
+def backfill(bind):
+    # the same counts as app.rollups.rebuild_question_stats
+    positions = {}
+    for row in bind.execute(sa.select([questions])):
+        positions[row.question_id] = {
+            row[f'answer_choice_{n}']: n
+            for n in range(1, 5)
+            if row[f'answer_choice_{n}']
+        }
+    totals, daily = {}, {}
+    day = sa.func.date(attempts.c.date)
+    rows = bind.execute(
+        sa.select([
+            attempt_answers.c.question_id,
+            attempt_answers.c.answer,
+            attempt_answers.c.correct,
+            day,
+            sa.func.count(),
+        ])
+        .select_from(attempt_answers.join(
+            attempts, attempts.c.attempt_id == attempt_answers.c.attempt_id
+        ))
+        .group_by(
+            attempt_answers.c.question_id,
+            attempt_answers.c.answer,
+            attempt_answers.c.correct,
+            day,
+        )
+    )
+    for question_id, answer, correct, value, count in rows:
+        counts = totals.setdefault(question_id, dict(
+            question_id=question_id, answered=0, correct=0, blank=0,
+            choice_1=0, choice_2=0, choice_3=0, choice_4=0, other=0,
+        ))
+        if not answer:
+            slot = 'blank'
+        else:
+            position = positions.get(question_id, {}).get(answer)
+            slot = f'choice_{position}' if position else 'other'
+        counts['answered'] += count
+        counts['correct'] += count if correct else 0
+        counts[slot] += count
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = date.fromisoformat(value)
+        counts = daily.setdefault((question_id, value), dict(
+            question_id=question_id, day=value, answered=0, correct=0,
+        ))
+        counts['answered'] += count
+        counts['correct'] += count if correct else 0
+    if totals:
+        bind.execute(question_stats.insert(), list(totals.values()))
+    if daily:
+        bind.execute(question_daily_stats.insert(), list(daily.values()))
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('question_daily_stats',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('answered', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+    sa.PrimaryKeyConstraint('question_id', 'day')
+    )
+    with op.batch_alter_table('question_daily_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_question_daily_stats_day'), ['day'], unique=False)
+
+    op.create_table('question_stats',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('answered', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.Column('blank', sa.Integer(), nullable=False),
+    sa.Column('choice_1', sa.Integer(), nullable=False),
+    sa.Column('choice_2', sa.Integer(), nullable=False),
+    sa.Column('choice_3', sa.Integer(), nullable=False),
+    sa.Column('choice_4', sa.Integer(), nullable=False),
+    sa.Column('other', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+    # ### end Alembic commands ###
+    backfill(op.get_bind())
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('question_stats')
+    with op.batch_alter_table('question_daily_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_question_daily_stats_day'))
+
+    op.drop_table('question_daily_stats')
+    # ### end Alembic commands ###
@@ -0,0 +1,63 @@
+"""daily stats
+
+Revision ID: 2564166ee399
+Revises: 080c508db905
+Create Date: 2026-10-18 10:40:43.694295
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2564166ee399'
+down_revision = '080c508db905'
+branch_labels = None
+depends_on = None
+
+logs = sa.table('logs', sa.column('date', sa.DateTime))
+attempts = sa.table('attempts', sa.column('date', sa.DateTime))
+daily_stats = sa.table(
+    'daily_stats',
+    sa.column('day', sa.Date),
+    sa.column('visitors', sa.Integer),
+    sa.column('attempts', sa.Integer),
+)
+
+
+def backfill(bind):
+    # the same counts as app.rollups.rebuild_daily_stats
+    counts = {}
+    for table, column in ((logs, 'visitors'), (attempts, 'attempts')):
+        day = sa.func.date(table.c.date)
+        rows = bind.execute(
+            sa.select([day, sa.func.count()])
+            .where(table.c.date.isnot(None))
+            .group_by(day)
+        )
+        for value, count in rows:
+            if isinstance(value, str):
+                value = date.fromisoformat(value)  # SQLite returns DATE() as text
+            row = counts.setdefault(value, dict(day=value, visitors=0, attempts=0))
+            row[column] = count
+    if counts:
+        bind.execute(daily_stats.insert(), list(counts.values()))
+
+
+def upgrade():
+    # earlier copies of the baseline revision created the table already
+    if 'daily_stats' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('visitors', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    backfill(op.get_bind())
+
+
+def downgrade():
+    op.drop_table('daily_stats')
@@ -0,0 +1,138 @@
+"""normalize attempt answers
+
+Revision ID: 9672d19fd386
+Revises: 7b32c2fd7899
+Create Date: 2026-10-18 09:49:47.709711
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9672d19fd386'
+down_revision = '7b32c2fd7899'
+branch_labels = None
+depends_on = None
+
+# attempts are copied in keyset-ordered batches so memory stays bounded
+BATCH_SIZE = 1000
+POSITIONS = range(1, 8)
+
+questions = sa.table('questions', sa.column('question_id', sa.Integer))
+attempts = sa.table(
+    'attempts',
+    sa.column('attempt_id', sa.Integer),
+    sa.column('score', sa.Integer),
+    *[sa.column(f'answer_{n}', sa.String) for n in POSITIONS],
+    *[sa.column(f'correct_{n}', sa.Boolean) for n in POSITIONS],
+)
+attempt_answers = sa.table(
+    'attempt_answers',
+    sa.column('attempt_id', sa.Integer),
+    sa.column('question_id', sa.Integer),
+    sa.column('answer', sa.String),
+    sa.column('correct', sa.Boolean),
+)
+
+
+def batches(bind, query, key):
+    last = None
+    while True:
+        page = query if last is None else query.where(key > last)
+        rows = bind.execute(page.order_by(key).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def question_positions(bind):
+    # the old columns were matched to the questions in id order
+    ids = bind.execute(
+        sa.select([questions.c.question_id]).order_by(questions.c.question_id)
+    ).scalars().all()
+    return list(zip(POSITIONS, ids))
+
+
+def upgrade():
+    op.create_table('attempt_answers',
+    sa.Column('attempt_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('answer', sa.String(length=256), nullable=True),
+    sa.Column('correct', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['attempt_id'], ['attempts.attempt_id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+    sa.PrimaryKeyConstraint('attempt_id', 'question_id')
+    )
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('score', sa.Integer(), server_default='0', nullable=False))
+
+    bind = op.get_bind()
+    positions = question_positions(bind)
+    query = sa.select(
+        [attempts.c.attempt_id]
+        + [attempts.c[f'answer_{n}'] for n in POSITIONS]
+        + [attempts.c[f'correct_{n}'] for n in POSITIONS]
+    )
+    set_score = (
+        attempts.update()
+        .where(attempts.c.attempt_id == sa.bindparam('_id'))
+        .values(score=sa.bindparam('_score'))
+    )
+    for rows in batches(bind, query, attempts.c.attempt_id):
+        answers, scores = [], []
+        for row in rows:
+            score = 0
+            for n, question_id in positions:
+                correct = bool(row[f'correct_{n}'])
+                score += correct
+                answers.append({
+                    'attempt_id': row.attempt_id,
+                    'question_id': question_id,
+                    'answer': row[f'answer_{n}'],
+                    'correct': correct,
+                })
+            scores.append({'_id': row.attempt_id, '_score': score})
+        if answers:
+            bind.execute(attempt_answers.insert(), answers)
+        bind.execute(set_score, scores)
+
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        for n in POSITIONS:
+            batch_op.drop_column(f'answer_{n}')
+            batch_op.drop_column(f'correct_{n}')
+
+
+def downgrade():
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        for n in POSITIONS:
+            batch_op.add_column(sa.Column(f'answer_{n}', sa.String(length=256), nullable=True))
+            batch_op.add_column(sa.Column(f'correct_{n}', sa.Boolean(), nullable=True))
+
+    bind = op.get_bind()
+    positions = question_positions(bind)
+    columns = {question_id: n for n, question_id in positions}
+    query = sa.select([attempts.c.attempt_id])
+    for rows in batches(bind, query, attempts.c.attempt_id):
+        ids = [row.attempt_id for row in rows]
+        values = {attempt_id: {} for attempt_id in ids}
+        for answer in bind.execute(
+            sa.select([attempt_answers]).where(attempt_answers.c.attempt_id.in_(ids))
+        ):
+            n = columns.get(answer.question_id)
+            if n is not None:
+                values[answer.attempt_id][f'answer_{n}'] = answer.answer
+                values[answer.attempt_id][f'correct_{n}'] = answer.correct
+        for attempt_id, row in values.items():
+            if row:
+                bind.execute(
+                    attempts.update()
+                    .where(attempts.c.attempt_id == attempt_id)
+                    .values(**row)
+                )
+
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.drop_column('score')
+
+    op.drop_table('attempt_answers')
@@ -1,7 +1,16 @@
-from app import app, db
-from app.models import User, Log, Question, Attempt
+from app import create_app, db
+from app.models import User, Log, Question, Attempt, DailyStat
+
+app = create_app()
 
 
 @app.shell_context_processor
 def make_shell_context():
-    return {"db": db, "User": User, "Log": Log, "Question": Question, "Attempt": Attempt}
+    return {
+        "db": db,
+        "User": User,
+        "Log": Log,
+        "Question": Question,
+        "Attempt": Attempt,
+        "DailyStat": DailyStat,
+    }
@@ -1,5 +1,5 @@
 import unittest, os, time
-from app import app, db
+from app import create_app, db
 from app.models import User, Attempt
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,6 +11,7 @@ from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 
 
 basedir = os.path.abspath(os.path.dirname(__file__))
+app = create_app()
 
 # To do, find simple way for switching from test context to development to production.
 
@@ -34,12 +35,13 @@ class SystemTest(unittest.TestCase):
     def tearDown(self):
         if self.driver:
             self.driver.close()
-            User1 = User.query.get("potat")
-            User2 = User.query.get("yes")
-            db.session.delete(User1)
-            db.session.delete(User2)
-            db.session.commit()
-            db.session.remove()
+            with app.app_context():
+                User1 = User.query.get("potat")
+                User2 = User.query.get("yes")
+                db.session.delete(User1)
+                db.session.delete(User2)
+                db.session.commit()
+                db.session.remove()
 
     def test_logintest(self):
         self.driver.get("http://127.0.0.1:5000/")
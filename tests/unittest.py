@@ -1,35 +1,66 @@
-import unittest, os
-from app import app, db
-from app.models import User, Log, Question, Attempt
+import unittest, os, json, tempfile, gzip, threading, time
+from app import create_app, db, token_cache, user_cache, password_hasher, assets, compression
+from app.metrics import Metrics
+from app.passwords import PasswordHasher
+from app.log_buffer import LogBuffer, log_buffer
+from app.forms import quiz_form_class
+from flask import render_template, url_for
+from unittest import mock
+from contextlib import contextmanager
+from app.models import (
+    User,
+    Log,
+    Question,
+    Attempt,
+    AttemptAnswer,
+    DailyStat,
+    UserSummary,
+    QuestionStat,
+    QuestionDailyStat,
+    load_user,
+)
+from app.rollups import (
+    rebuild_daily_stats,
+    rebuild_question_stats,
+    rebuild_user_summaries,
+)
+from app.question_stats import question_report
+from app.leaderboard import leaderboard_page, user_rank, decode_cursor as decode_rank_cursor
+from app.question_bank import question_bank
+from app.pagination import decode_cursor, keyset_page, id_page
+from app.seed import seed, QUESTIONS
+from app.instrumentation import QueryBudgetExceeded, count_queries, query_budget
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
 from app.controllers import (
     UserController,
     LogController,
     AttemptController,
     ReviewController,
 )
-from datetime import date
-from config import Config, TestingConfig
+from datetime import datetime
+from config import Config, TestingConfig, ProductionConfig, get_config, engine_options
 
 
 class UnitTest(unittest.TestCase):
     def setUp(self):
         """Setting up."""
-        basedir = os.path.abspath(os.path.dirname(__file__))
-        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
-            basedir, "test.db"
-        )
-        app.config["TESTING"] = True
-        app.config["WTF_CSRF_ENABLED"] = False
-        self.app = app.test_client()  # creates a virtual test environment
+        self.flask_app = create_app(TestingConfig)
+        self.app_context = self.flask_app.app_context()
+        self.app_context.push()
+        self.app = self.flask_app.test_client()  # creates a virtual test environment
         db.create_all()
         s1 = User(id="OwO", surname="Case")
         s1.set_password("hello")
         s2 = User(id="wOw", first_name="Unit", surname="Test", isAdmin=True)
         s2.set_password("goodbye")
 
-        t1 = Attempt(user_id="OwO", answer_1="potato", correct_1=True)
-        t2 = Attempt(user_id="OwO", answer_1="potato", correct_1=True)
-        t3 = Attempt(user_id="wOw", answer_1="potato", correct_1=True)
+        t1 = Attempt(user_id="OwO", score=1)
+        t1.answers = [AttemptAnswer(question_id=1, answer="potato", correct=True)]
+        t2 = Attempt(user_id="OwO", score=1)
+        t2.answers = [AttemptAnswer(question_id=1, answer="potato", correct=True)]
+        t3 = Attempt(user_id="wOw", score=1)
+        t3.answers = [AttemptAnswer(question_id=1, answer="potato", correct=True)]
 
         q1 = Question(
             question="Who is Steve Jobs?", answer_type="SAQ", answer="Founder of Apple"
@@ -58,11 +89,23 @@ class UnitTest(unittest.TestCase):
         db.session.add(l2)
         db.session.commit()
 
-        self.assertEqual(app.debug, False)
+        self.assertEqual(self.flask_app.debug, False)
 
     def tearDown(self):
         db.session.remove()
         db.drop_all()
+        self.app_context.pop()
+
+    @contextmanager
+    def record_commits(self):
+        """Collect the sessions committed inside the block."""
+        commits = []
+        record = lambda session: commits.append(session)
+        event.listen(db.session, "after_commit", record)
+        try:
+            yield commits
+        finally:
+            event.remove(db.session, "after_commit", record)
 
     def test_password_hashing(self):
         """Make password hasing works."""
@@ -71,6 +114,107 @@ class UnitTest(unittest.TestCase):
         self.assertFalse(s.check_password("case"))
         self.assertTrue(s.check_password("test"))
 
+    def test_token_cache(self):
+        """Make sure token lookups are cached and dropped on revocation."""
+        token_cache.clear()
+        token = User.query.get("OwO").get_token()
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(User.check_token(token).id, "OwO")
+        db.session.remove()
+        with count_queries() as stats:
+            user = User.check_token(token)
+        self.assertEqual(user.id, "OwO")
+        self.assertEqual(stats.count, 0, "Cached token should not hit the database")
+        user.revoke_token()
+        db.session.commit()
+        self.assertIsNone(token_cache.get(token), "Revoking should drop the entry")
+        self.assertIsNone(User.check_token(token))
+
+        # another worker's token cache still has the entry, but the user row
+        # it loads shows the revocation
+        token = User.query.get("OwO").get_token()
+        db.session.commit()
+        User.check_token(token)
+        self.assertEqual(len(token_cache.get(token)), 2, "Only the id and expiry are cached")
+        stale = token_cache.get(token)
+        User.query.get("OwO").revoke_token()
+        db.session.commit()
+        token_cache.set(token, stale)
+        self.assertIsNone(User.check_token(token))
+
+    def test_signed_token(self):
+        """Make sure signed tokens verify without the database and can be revoked."""
+        self.flask_app.config["TOKEN_MODE"] = "signed"
+        user = User.query.get("OwO")
+        token = user.get_token()
+        self.assertIsNone(user.token, "Signed tokens are not stored")
+        self.assertEqual(User.check_token(token).id, "OwO")  # warms the user cache
+        with count_queries() as stats:
+            self.assertEqual(User.check_token(token).id, "OwO")
+        self.assertEqual(stats.count, 0, "Verification should not query")
+        headers = {"Authorization": "Bearer " + token}
+        response = self.app.get("/api/users/OwO", headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertIsNone(User.check_token(token[:-2] + "xx"), "Bad signature")
+        self.assertIsNone(User.check_token(user.get_token(expires_in=-1)), "Expired")
+        user = User.query.get("OwO")
+        user.revoke_token()
+        db.session.commit()
+        self.assertIsNone(User.check_token(token), "Revoked by the generation bump")
+        self.assertEqual(User.check_token(user.get_token()).id, "OwO")
+
+    def test_user_cache(self):
+        """Make sure the user loader is served from the cache until the row changes."""
+        user_cache.clear()
+        self.assertEqual(load_user("OwO").surname, "Case")
+        db.session.remove()
+        with count_queries() as stats:
+            user = load_user("OwO")
+            self.assertIs(User.query.get("OwO"), user, "Lookups should be de-duplicated")
+        self.assertEqual(stats.count, 0, "Cached user should not hit the database")
+        user.surname = "Changed"
+        db.session.commit()
+        self.assertIsNone(user_cache.get("OwO"), "Commit should drop the cached user")
+        db.session.remove()
+        self.assertEqual(load_user("OwO").surname, "Changed")
+
+    def test_password_rehash(self):
+        """Make sure hashes from an outdated policy are replaced on login."""
+        s = User.query.get("OwO")
+        s.password_hash = generate_password_hash("hello", "pbkdf2:sha256:1000")
+        self.assertTrue(password_hasher.needs_rehash(s.password_hash))
+        self.assertFalse(s.check_password("wrong"))
+        self.assertIn("pbkdf2:sha256:1000$", s.password_hash, "No rehash on failure")
+        self.assertTrue(s.check_password("hello"))
+        self.assertTrue(s.password_hash.startswith(password_hasher.method + "$"))
+        self.assertFalse(password_hasher.needs_rehash(s.password_hash))
+
+        # logging in saves the upgrade even though the visitor log is buffered
+        s.password_hash = generate_password_hash("hello", "pbkdf2:sha256:1000")
+        db.session.commit()
+        self.addCleanup(setattr, log_buffer, "mode", log_buffer.mode)
+        self.addCleanup(log_buffer.close)
+        log_buffer.mode = "async"
+        response = self.app.post("/login", data={"l-username": "OwO", "l-password": "hello"})
+        self.assertEqual(response.status_code, 302)
+        db.session.remove()
+        stored = User.query.get("OwO").password_hash
+        self.assertTrue(stored.startswith(password_hasher.method + "$"))
+
+    def test_password_hash_concurrency(self):
+        """Make sure hashes beyond PASSWORD_HASH_MAX_CONCURRENCY wait for a slot."""
+        self.flask_app.config["PASSWORD_HASH_MAX_CONCURRENCY"] = 1
+        hasher = PasswordHasher(self.flask_app)
+        hasher.slots.acquire()  # another request is hashing
+        waiting = threading.Thread(target=hasher.hash, args=("hello",))
+        waiting.start()
+        waiting.join(0.2)
+        self.assertTrue(waiting.is_alive(), "The hash should wait for the slot")
+        hasher.slots.release()
+        waiting.join()
+
     def test_user_is_admin(self):
         """Make sure the role of the user is correctly identified."""
         s = User.query.get("OwO")
@@ -82,8 +226,9 @@ class UnitTest(unittest.TestCase):
         """Make sure attempt model works."""
         t = Attempt.query.all()
         self.assertEqual(t[0].attempt_id, 1, "Attempt_id should be 1")
-        self.assertEqual(t[0].answer_1, "potato", "Asnwer_1 should be potato")
-        self.assertTrue(t[0].correct_1)
+        self.assertEqual(t[0].answers[0].answer, "potato", "Answer should be potato")
+        self.assertTrue(t[0].answers[0].correct)
+        self.assertEqual(t[0].score, 1, "Score should be 1")
         self.assertEqual(t[0].user_id, "OwO", "User_id should be OwO")
         u1 = User.query.get("OwO")
         self.assertEqual(
@@ -140,27 +285,393 @@ class UnitTest(unittest.TestCase):
     def test_date(self):
         """Make sure the dates are correct in the models."""
         s = User.query.get("OwO")
-        self.assertEqual(s.date.date(), date.today(), "User date is wrong")
+        self.assertEqual(s.date.date(), datetime.utcnow().date(), "User date is wrong")
         self.assertEqual(
             s.attempts.filter_by(attempt_id=1).first().date.date(),
-            date.today(),
+            datetime.utcnow().date(),
             "Date of user's attempt is wrong",
         )
         self.assertEqual(
             s.logs.filter_by(log_id=1).first().date.date(),
-            date.today(),
+            datetime.utcnow().date(),
             "Date of user's log is wrong",
         )
         q1 = Question.query.get(1)
         self.assertEqual(
             q1.date.date(),
-            date.today(),
+            datetime.utcnow().date(),
             "Date of question is wrong",
         )
 
+    def test_question_bank(self):
+        """Make sure the question bank is cached and invalidated on changes."""
+        bank = question_bank.get()
+        misses = question_bank.misses
+        self.assertIs(question_bank.get(), bank, "Bank should be served from cache")
+        self.assertEqual(question_bank.misses, misses)
+        self.assertEqual(bank.answer_key, {1: "Founder of Apple", 2: "1"})
+        self.assertEqual(
+            bank.grade({1: "Founder of Apple", 2: "2", 3: "3"}),
+            {1: True, 2: False, 3: False},
+        )
+        db.session.add(Question(question="Pick 2", answer_type="SAQ", answer="2"))
+        db.session.commit()
+        bank2 = question_bank.get()
+        self.assertEqual(question_bank.misses, misses + 1, "Commit should invalidate")
+        self.assertEqual(len(bank2), 3)
+        self.assertNotEqual(bank2.version, bank.version)
+
+        # other workers' changes arrive once the ttl runs out
+        self.addCleanup(setattr, question_bank, "ttl", question_bank.ttl)
+        question_bank.ttl = 30
+        later = time.monotonic() + 31
+        with mock.patch("app.question_bank.time.monotonic", return_value=later):
+            self.assertIs(question_bank.get(), bank2, "An unchanged reload keeps the snapshot")
+        self.assertEqual(question_bank.misses, misses + 2)
+
+    def test_quiz_form(self):
+        """Make sure the quiz form and its markup are built once per bank version."""
+        bank = question_bank.get()
+        form_class = quiz_form_class(bank)
+        self.assertIs(quiz_form_class(question_bank.get()), form_class)
+        self.assertEqual(form_class.question_ids, (1, 2))
+
+        self.app.post("/login", data={"l-username": "OwO", "l-password": "hello"})
+        with mock.patch(
+            "app.controllers.render_template", wraps=render_template
+        ) as render:
+            self.app.get("/quiz")
+            self.app.get("/quiz")
+        rendered = [call.args[0] for call in render.call_args_list]
+        self.assertEqual(rendered.count("quiz_questions.html"), 1)
+
+        response = self.app.post(
+            "/quiz", data={"question_1": " founder of APPLE ", "question_2": "1"}
+        )
+        self.assertEqual(response.status_code, 302)
+        attempt = Attempt.query.order_by(Attempt.attempt_id.desc()).first()
+        self.assertEqual(attempt.score, 2, "Typed answers ignore case and spacing")
+
+        db.session.add(Question(question="Pick 2", answer_type="SAQ", answer="2"))
+        db.session.commit()
+        self.assertIsNot(quiz_form_class(question_bank.get()), form_class)
+
+    def test_submit_attempt(self):
+        """Make sure a submission is graded and stored with a single commit."""
+        with self.record_commits() as commits:
+            attempt = Attempt(user_id="OwO")
+            attempt.set_answers({1: "Founder of Apple"})
+            AttemptController.submit(attempt)
+        self.assertEqual(len(commits), 1, "Submission should commit once")
+        stored = Attempt.query.get(attempt.attempt_id)
+        self.assertEqual(stored.score, 1)
+        self.assertEqual(
+            [(answer.question_id, answer.correct) for answer in stored.answers],
+            [(1, True), (2, False)],
+            "Unanswered questions should be marked incorrect",
+        )
+
+    def test_attempt_batch(self):
+        """Make sure a batch of attempts is graded and stored in one transaction."""
+        token = User.query.get("OwO").get_token()
+        db.session.commit()
+        headers = {"Authorization": "Bearer " + token}
+        batch = [
+            {"answers": {"1": "Founder of Apple"}, "date": "2021-05-01T10:00:00"},
+            {"answers": {"9": "?"}},
+            {"answers": [{"question_id": 2, "answer": "1"}]},
+        ] * 10
+        with self.record_commits() as commits, count_queries() as stats:
+            response = self.app.post(
+                "/api/users/OwO/attempts/batch", json=batch, headers=headers
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["_meta"], {"created": 20, "rejected": 10})
+        self.assertEqual([item["status"] for item in data["items"][:3]], [201, 400, 201])
+        self.assertEqual(data["items"][0]["attempt"]["score"], 1)
+        self.assertEqual(len(commits), 1, "The batch should commit once")
+        inserts = [s for s in stats.statements if "INSERT INTO attempt_answers" in s]
+        self.assertEqual(stats.statements[inserts[0]], 1, "Answers in one executemany")
+        self.assertEqual(Attempt.query.filter_by(user_id="OwO").count(), 22)
+
+        lines = "\n".join(json.dumps(item) for item in batch[:3]) + "\nnot json\n"
+        response = self.app.post(
+            "/api/users/OwO/attempts/batch",
+            data=lines,
+            content_type="application/x-ndjson",
+            headers=headers,
+        )
+        self.assertEqual(response.get_json()["_meta"], {"created": 2, "rejected": 2})
+
+        # a question answered twice is refused without failing the rest
+        repeated = [
+            {"answers": {"1": "a", "01": "b"}},
+            {"answers": [{"question_id": 1, "answer": "a"}, {"question_id": "1"}]},
+            {"answers": {"1": "Founder of Apple"}},
+        ]
+        url = "/api/users/OwO/attempts/batch"
+        data = self.app.post(url, json=repeated, headers=headers).get_json()
+        self.assertEqual(data["_meta"], {"created": 1, "rejected": 2})
+        self.assertIn("more than once", data["items"][0]["error"])
+
+        url = "/api/users/OwO/attempts"
+        for body in (repeated[0], repeated[1], ["not", "an", "object"], "attempt"):
+            response = self.app.post(url, json=body, headers=headers)
+            self.assertEqual(response.status_code, 400, body)
+        response = self.app.post(url, json={"date": "yesterday"}, headers=headers)
+        self.assertIn("date", response.get_json()["message"])
+
+    def test_keyset_page(self):
+        """Make sure attempts are paged newest first with a (date, id) cursor."""
+        query = Attempt.query.filter_by(user_id="OwO")
+        page, cursor = keyset_page(query, Attempt.date, Attempt.attempt_id, limit=1)
+        self.assertEqual([a.attempt_id for a in page], [2])
+        page, cursor = keyset_page(
+            query, Attempt.date, Attempt.attempt_id, decode_cursor(cursor), 1
+        )
+        self.assertEqual([a.attempt_id for a in page], [1])
+        self.assertIsNone(cursor, "Last page should have no cursor")
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_id_page(self):
+        """Make sure API pages follow the attempt id cursor."""
+        page, after = id_page(Attempt.query, Attempt.attempt_id, limit=2)
+        self.assertEqual([a.attempt_id for a in page], [1, 2])
+        self.assertEqual(after, 2)
+        page, after = id_page(Attempt.query, Attempt.attempt_id, after, 2)
+        self.assertEqual([a.attempt_id for a in page], [3])
+        self.assertIsNone(after)
+
+    def test_daily_stats(self):
+        """Make sure the daily counters follow log and attempt inserts and deletes."""
+        today = DailyStat.query.get(datetime.utcnow().date())
+        self.assertEqual(today.visitors, 2, "Two visits should be counted")
+        self.assertEqual(today.attempts, 3, "Three attempts should be counted")
+        db.session.delete(Attempt.query.get(3))
+        db.session.commit()
+        self.assertEqual(DailyStat.query.get(today.day).attempts, 2)
+        DailyStat.query.delete()
+        db.session.commit()
+        self.assertEqual(rebuild_daily_stats(), 1, "Backfill should cover one day")
+        today = DailyStat.query.get(today.day)
+        self.assertEqual(today.visitors, 2)
+        self.assertEqual(today.attempts, 2)
+
+    def test_sqlite_tuning(self):
+        """Make sure SQLite connections run in WAL mode with a busy timeout."""
+        self.assertEqual(db.session.execute("PRAGMA journal_mode").scalar(), "wal")
+        self.assertEqual(db.session.execute("PRAGMA synchronous").scalar(), 1)
+        self.assertEqual(db.session.execute("PRAGMA busy_timeout").scalar(), 5000)
+
+    def test_config_selection(self):
+        """Make sure the config class and engine options follow the environment."""
+        self.assertIs(get_config("production"), ProductionConfig)
+        self.assertIs(get_config("testing"), TestingConfig)
+        self.assertIs(get_config("unknown"), Config)
+        self.assertEqual(engine_options("sqlite:///app.db"), {})
+        options = engine_options("postgresql://localhost/pcwiki")
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertIn("pool_size", options)
+
+    def test_seed(self):
+        """Make sure seeding is idempotent and repairs changed questions."""
+        db.session.add(Question(question=QUESTIONS[0]["question"], answer="old"))
+        db.session.commit()
+        admin_created, counts = seed()
+        self.assertTrue(admin_created)
+        self.assertEqual(counts, (6, 1, 0), "Unkeyed row should be adopted")
+        self.assertEqual(Question.query.count(), 2 + 7)
+        self.assertEqual(seed(), (False, (0, 0, 7)), "Second run should be a no-op")
+        question = Question.query.filter_by(key="motherboard").first()
+        question.answer = "cpu"
+        db.session.commit()
+        self.assertEqual(seed()[1], (0, 1, 6))
+        self.assertEqual(Question.query.get(question.question_id).answer, "motherboard")
+
+    def test_query_budgets(self):
+        """Make sure each route stays within its query budget once caches are warm."""
+        self.app.post("/login", data={"l-username": "wOw", "l-password": "goodbye"})
+        token = User.query.get("wOw").get_token()
+        db.session.commit()
+        headers = {"Authorization": "Bearer " + token}
+        budgets = [
+            ("GET", "/", {}, 0),
+            ("GET", "/quiz", {}, 0),
+            ("POST", "/quiz", {"data": {"question_1": "1"}}, 6),
+            ("GET", "/review", {}, 3),
+            ("GET", "/stat", {}, 4),
+            ("GET", "/api/quiz/", {"headers": headers}, 0),
+            ("GET", "/api/attempts/", {"headers": headers}, 2),
+            ("GET", "/api/users/wOw", {"headers": headers}, 0),
+            ("GET", "/api/users/wOw/attempts", {"headers": headers}, 3),
+            (
+                "POST",
+                "/api/users/wOw/attempts",
+                {"headers": headers, "json": {"answers": {"1": "1"}}},
+                9,
+            ),
+        ]
+        for method, path, kwargs, budget in budgets:
+            self.app.open(path, method=method, **kwargs)  # warm the caches
+            with query_budget(budget, max_repeats=1):
+                response = self.app.open(path, method=method, **kwargs)
+            self.assertLess(response.status_code, 400, f"{method} {path}")
+
+    def test_query_budget_exceeded(self):
+        """Make sure repeated per-row queries are caught."""
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(10, max_repeats=1):
+                for attempt in Attempt.query.all():
+                    db.session.expire(attempt)
+                    attempt.user_id
+        with count_queries() as stats:
+            for user_id in ("OwO", "wOw", "OwO"):
+                User.query.filter_by(id=user_id).first()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.repeated()[0][1], 3, "Same statement, new parameters")
+
+    def test_conditional_get(self):
+        """Make sure unchanged pages are answered with 304 before any heavy work."""
+        self.app.post("/login", data={"l-username": "OwO", "l-password": "hello"})
+        token = User.query.get("OwO").get_token()
+        db.session.commit()
+        auth = {"Authorization": "Bearer " + token}
+        for path, headers in [
+            ("/review", {}),
+            ("/learn", {}),
+            ("/api/quiz/", auth),
+            ("/api/users/OwO/attempts", auth),
+        ]:
+            response = self.app.get(path, headers=headers)
+            etag = response.headers["ETag"]
+            self.assertTrue(etag.startswith("W/"), path)
+            headers = dict(headers, **{"If-None-Match": etag})
+            with count_queries() as stats:
+                response = self.app.get(path, headers=headers)
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(response.get_data(), b"")
+            self.assertLessEqual(stats.count, 1, "Only the stamp should be read")
+
+        review = self.app.get("/review").headers["ETag"]
+        attempt = Attempt(user_id="OwO")
+        attempt.set_answers({1: "Founder of Apple"})
+        AttemptController.submit(attempt)
+        response = self.app.get("/review", headers={"If-None-Match": review})
+        self.assertEqual(response.status_code, 200, "A new attempt changes the page")
+
+        learn = self.app.get("/learn").headers["ETag"]
+        self.app.get("/logout")
+        response = self.app.get("/learn", headers={"If-None-Match": learn})
+        self.assertEqual(response.status_code, 200, "Signing out changes the page")
+
+    def test_metrics(self):
+        """Make sure /metrics reports requests, latency and caches to admins only."""
+        self.app.get("/")
+        text = self.app.get("/metrics").get_data(as_text=True)
+        self.assertIn(
+            'pc_wiki_requests_total{endpoint="main.index",method="GET",status="200"}',
+            text,
+        )
+        self.assertIn('pc_wiki_request_duration_seconds_bucket{endpoint="main.index"', text)
+        self.assertIn('pc_wiki_db_queries_total{endpoint="main.index"}', text)
+        self.assertIn('pc_wiki_cache_hits_total{cache="token"}', text)
+
+        remote = {"REMOTE_ADDR": "203.0.113.9"}
+        self.assertEqual(self.app.get("/metrics", environ_base=remote).status_code, 403)
+        self.app.post("/login", data={"l-username": "wOw", "l-password": "goodbye"})
+        self.assertEqual(self.app.get("/metrics", environ_base=remote).status_code, 200)
+
+    def test_metrics_across_workers(self):
+        """Make sure totals written by other workers are added to the scrape."""
+        with tempfile.TemporaryDirectory() as directory:
+            worker = Metrics()
+            worker.directory = directory
+            worker.observe("main.index", "GET", 200, 0.002, 0.001, 1)
+            other = worker.dump()
+            with open(os.path.join(directory, "metrics-1.json"), "w") as file:
+                json.dump(other, file)
+            worker.observe("main.index", "GET", 200, 0.2)
+            totals, _ = worker.collect()
+        self.assertEqual(totals["requests"][("main.index", "GET", "200")], 3)
+        latency = totals["latency"][("main.index", "GET")]
+        self.assertEqual(latency[0], 2, "Two requests fell in the 5ms bucket")
+        self.assertEqual(totals["db_queries"]["main.index"], 2)
+
+    def test_question_import_export(self):
+        """Make sure the bank round-trips through export and import in every format."""
+        for question in Question.query:
+            question.key = f"setup-{question.question_id}"
+        token = User.query.get("wOw").get_token()
+        db.session.commit()
+        headers = {"Authorization": "Bearer " + token}
+        rows = [
+            {"key": f"q{n}", "question": f"Q{n}?", "answer_type": "SAQ", "answer": "a"}
+            for n in range(30)
+        ]
+        self.flask_app.config["QUESTION_IMPORT_BATCH_SIZE"] = 7
+        response = self.app.post("/api/questions", json=rows, headers=headers)
+        self.assertEqual(
+            response.get_json(), {"created": 30, "updated": 0, "unchanged": 0}
+        )
+        self.assertEqual(len(question_bank.get()), 32, "Import should refresh the bank")
+
+        for fmt in ("json", "ndjson", "csv"):
+            exported = self.app.get(f"/api/questions?format={fmt}", headers=headers)
+            response = self.app.post(
+                "/api/questions",
+                data=exported.get_data(),
+                content_type=exported.mimetype,
+                headers=headers,
+            )
+            self.assertEqual(response.get_json()["unchanged"], 32, fmt)
+
+        rows[3]["answer"] = "b"
+        rows[5] = {"key": "q5"}
+        response = self.app.post("/api/questions", json=rows, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("question 6", response.get_json()["message"])
+        self.assertEqual(Question.query.filter_by(key="q3").one().answer, "a")
+
+        # malformed files are refused the same way, not as server errors
+        huge = "key,question,answer_type,answer\nbig," + "x" * 200000 + ",SAQ,a\n"
+        bad_bytes = b"key,question,answer_type,answer\nq1,\xff\xfe?,SAQ,a\n"
+        for body in (huge.encode(), bad_bytes):
+            response = self.app.post(
+                "/api/questions", data=body, content_type="text/csv", headers=headers
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("question 1", response.get_json()["message"])
+        self.assertEqual(Question.query.count(), 32)
+
+        runner = self.flask_app.test_cli_runner()
+        result = runner.invoke(args=["questions", "export", "--format", "ndjson"])
+        self.assertEqual(len(result.output.splitlines()), 32)
+
     def test_app_exists(self):
         """Make sure the app exists."""
-        self.assertFalse(app is None)
+        self.assertFalse(self.flask_app is None)
+
+    def test_api_blueprint(self):
+        """Make sure the API is served from its blueprint, eagerly or lazily."""
+        token = User.query.get("OwO").get_token()
+        db.session.commit()
+        headers = {"Authorization": "Bearer " + token}
+        response = self.app.get("/api/quiz/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 2)
+
+        class LazyConfig(TestingConfig):
+            LAZY_API = True
+
+        lazy_app = create_app(LazyConfig)
+        self.assertEqual(
+            lazy_app.view_functions["api.get_questions"].import_name,
+            "app.api.quiz_api.get_questions",
+        )
+        response = lazy_app.test_client().get("/api/quiz/", headers=headers)
+        self.assertEqual(response.status_code, 200)
 
     def test_home_page(self):
         """Make sure homepage works."""
@@ -168,5 +679,188 @@ class UnitTest(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+    def test_static_assets(self):
+        """Make sure built assets get fingerprinted urls and immutable, compressed responses."""
+        # reloading once the build is deleted goes back to plain static files
+        self.addCleanup(assets.load)
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = assets.build(self.flask_app.static_folder, directory)
+            built = manifest["files"]["pc-wiki.css"]
+            self.assertRegex(built, r"^pc-wiki\.[0-9a-f]{12}\.css$")
+            self.assertIn("gzip", manifest["encodings"][built])
+            assets.load(directory)
+            with self.flask_app.test_request_context():
+                url = url_for("static", filename="pc-wiki.css")
+            self.assertEqual(url, "/static/" + built)
+            self.assertIn(url, self.app.get("/").get_data(as_text=True))
+
+            with open(os.path.join(self.flask_app.static_folder, "pc-wiki.css"), "rb") as file:
+                original = file.read()
+            response = self.app.get(url, headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertIn("immutable", response.headers["Cache-Control"])
+            self.assertIn("Accept-Encoding", response.headers["Vary"])
+            self.assertEqual(gzip.decompress(response.data), original)
+            response.close()
+            response = self.app.get(url, headers={"Accept-Encoding": "identity"})
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(response.data, original)
+            response.close()
+
+            # unbuilt names are still served from app/static as before
+            response = self.app.get("/static/pc-wiki.css")
+            self.assertEqual(response.data, original)
+            self.assertNotIn("immutable", response.headers.get("Cache-Control", ""))
+            response.close()
+
+    def test_compression(self):
+        """Make sure large text responses are compressed, streamed ones included."""
+        self.app.post("/login", data={"l-username": "wOw", "l-password": "goodbye"})
+        plain = self.app.get("/learn")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+        gzipped = {"Accept-Encoding": "gzip"}
+        response = self.app.get("/learn", headers=gzipped)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data))
+
+        # the same ETag serves the cached compressed bytes
+        hits = compression.cache.stats()["hits"]
+        self.assertEqual(self.app.get("/learn", headers=gzipped).data, response.data)
+        self.assertEqual(compression.cache.stats()["hits"], hits + 1)
+
+        # strong ETags become weak once the bytes change
+        response = self.app.get("/static/pc-wiki.css", headers=gzipped)
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+        response.close()
+
+        token = User.query.get("wOw").get_token()
+        headers = dict(gzipped, Authorization="Bearer " + token)
+        response = self.app.get("/api/questions?format=ndjson", headers=headers)
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(len(lines), Question.query.count())
+
+        # too small to be worth it
+        response = self.app.get("/api/users/wOw", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(int(response.headers["Content-Length"]), 500)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        # each app keeps its own middleware and settings
+        other = create_app(TestingConfig)
+        self.assertIsNot(other.wsgi_app, self.flask_app.wsgi_app)
+        self.assertIs(self.flask_app.wsgi_app.wsgi_app.__self__, self.flask_app)
+
+    def test_log_buffer(self):
+        """Make sure buffered visitor logs are written in batches and counted."""
+        buffer = LogBuffer(self.flask_app)
+        buffer.mode, buffer.size, buffer.interval = "async", 3, 60
+        self.addCleanup(buffer.close)
+        buffer.add("OwO")
+        buffer.add("wOw")
+        self.assertEqual(Log.query.count(), 2, "Nothing is written until a flush")
+        self.assertEqual(buffer.flush(), 2)
+        db.session.expire_all()
+        self.assertEqual(Log.query.count(), 4)
+        self.assertEqual(DailyStat.query.get(datetime.utcnow().date()).visitors, 4)
+
+        # a full buffer wakes the writer thread
+        for _ in range(3):
+            buffer.add("OwO")
+        for _ in range(50):
+            if Log.query.count() == 7:
+                break
+            db.session.remove()
+            buffer._thread.join(0.05)
+        self.assertEqual(Log.query.count(), 7)
+
+    def test_leaderboard(self):
+        """Make sure user summaries follow the attempts and rank the leaderboard."""
+        summary = UserSummary.query.get("OwO")
+        self.assertEqual((summary.attempts, summary.best_score, summary.last_score), (2, 1, 1))
+        best = Attempt(user_id="wOw", score=5)
+        db.session.add(best)
+        db.session.commit()
+        self.assertEqual(user_rank("wOw")[0], 1)
+        self.assertEqual(user_rank("OwO")[0], 2)
+
+        page, cursor = leaderboard_page(limit=1)
+        self.assertEqual([(rank, s.user_id) for rank, s in page], [(1, "wOw")])
+        page, cursor = leaderboard_page(decode_rank_cursor(cursor), limit=1)
+        self.assertEqual([(rank, s.user_id) for rank, s in page], [(2, "OwO")])
+        self.assertIsNone(cursor)
+
+        incremental = [s.to_dict() for s in UserSummary.query.order_by(UserSummary.user_id)]
+        self.assertEqual(rebuild_user_summaries(), 2)
+        rebuilt = [s.to_dict() for s in UserSummary.query.order_by(UserSummary.user_id)]
+        self.assertEqual(incremental, rebuilt, "Rebuild should match the incremental counts")
+
+        # a deleted attempt takes its best score with it, and tied scores share a rank
+        db.session.delete(best)
+        db.session.commit()
+        self.assertEqual(UserSummary.query.get("wOw").best_score, 1)
+        self.assertEqual([rank for rank, _ in leaderboard_page()[0]], [1, 1])
+
+        token = User.query.get("wOw").get_token()
+        headers = {"Authorization": "Bearer " + token}
+        data = self.app.get("/api/leaderboard?limit=1", headers=headers).get_json()
+        self.assertEqual(data["items"][0]["rank"], 1)
+        self.assertIsNotNone(data["_links"]["next"])
+        data = self.app.get(data["_links"]["next"], headers=headers).get_json()
+        self.assertEqual(data["_meta"]["count"], 1)
+        self.assertIsNone(data["_links"]["next"])
+        data = self.app.get("/api/users/wOw/summary", headers=headers).get_json()
+        self.assertEqual((data["attempts"], data["rank"]), (1, 1))
+
+        self.app.post("/login", data={"l-username": "wOw", "l-password": "goodbye"})
+        self.assertIn(b"Your progress", self.app.get("/leaderboard").data)
+
+    def test_question_stats(self):
+        """Make sure the per-question counters follow the answers and feed the report."""
+        stat = QuestionStat.query.get(1)
+        self.assertEqual((stat.answered, stat.correct, stat.other), (3, 3, 3))
+        self.app.post("/login", data={"l-username": "OwO", "l-password": "hello"})
+        self.app.post("/quiz", data={"question_2": "2"})
+        stat = QuestionStat.query.get(2)
+        self.assertEqual((stat.answered, stat.correct, stat.choice_2), (1, 0, 1))
+        self.assertEqual(QuestionStat.query.get(1).blank, 1, "Unanswered should be blank")
+        today = QuestionDailyStat.query.get((2, datetime.utcnow().date()))
+        self.assertEqual((today.answered, today.correct), (1, 0))
+
+        counters = lambda: (
+            [s.to_dict() for s in QuestionStat.query.order_by(QuestionStat.question_id)],
+            [repr(s) for s in QuestionDailyStat.query.order_by(QuestionDailyStat.question_id)],
+        )
+        incremental = counters()
+        self.assertEqual(rebuild_question_stats(), 2)
+        self.assertEqual(incremental, counters(), "Rebuild should match the incremental counts")
+
+        report = {item["question_id"]: item for item in question_report(days=7)}
+        self.assertEqual(report[1]["percent_correct"], 75.0)
+        self.assertEqual(
+            [(c["choice"], c["count"], c["correct"]) for c in report[2]["choices"]],
+            [("1", 0, True), ("2", 1, False), ("3", 0, False), ("4", 0, False)],
+        )
+        self.assertEqual(len(report[2]["trend"]), 7)
+        self.assertEqual(report[2]["trend"][-1]["answered"], 1)
+
+        token = User.query.get("OwO").get_token()
+        headers = {"Authorization": "Bearer " + token}
+        response = self.app.get("/api/questions/stats", headers=headers)
+        self.assertEqual(response.status_code, 403, "Only admins should see question stats")
+        headers = {"Authorization": "Bearer " + User.query.get("wOw").get_token()}
+        data = self.app.get("/api/questions/stats?days=3", headers=headers).get_json()
+        self.assertEqual([item["answered"] for item in data["items"]], [4, 1])
+        self.assertEqual(len(data["items"][0]["trend"]), 3)
+        response = self.app.get("/api/questions/stats?days=0", headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        self.app.get("/logout")
+        self.app.post("/login", data={"l-username": "wOw", "l-password": "goodbye"})
+        self.assertIn(b"75.0% correct from 4 answers.", self.app.get("/stat").data)
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)